@@ -0,0 +1,105 @@
+"""
+Benchmarks the Viper pipeline (lexing, parsing, and evaluation), or compares two sets of results.
+
+    python -m benchmarks run [-o results.json] [--sizes 10 100 ...] [--repeat N] [--no-memory]
+    python -m benchmarks compare baseline.json results.json [--threshold 0.1] [--min-seconds 0.001]
+    python -m benchmarks lex-stress [--sizes 1000 2000 ...] [--repeat N]
+    python -m benchmarks lex-file [--megabytes 100] [--repeat N]
+
+`compare` exits with a non-zero status if any metric regressed. `lex-stress` times the lexer over pathological lines of
+growing lengths, to show that it stays linear. `lex-file` measures the throughput of lexing a large generated file as a
+stream of lines.
+"""
+
+from .compare import DEFAULT_MIN_SECONDS, DEFAULT_THRESHOLD, compare_results, format_regression
+from .corpus import DEFAULT_SIZES, generate_program, viper_file_programs
+from .large_files import DEFAULT_MEGABYTES, benchmark_large_file
+from .lexer_stress import DEFAULT_STRESS_SIZES, benchmark_lexer_stress
+from .pipeline import STAGES, benchmark_programs
+
+import argparse
+import json
+import platform
+import sys
+
+
+def run(args: argparse.Namespace):
+    programs = viper_file_programs() + [generate_program(size) for size in args.sizes]
+    results = benchmark_programs(programs, args.repeat, not args.no_memory,
+                                 log=lambda message: print(message, file=sys.stderr))
+    output = {
+        'python': platform.python_version(),
+        'stages': STAGES,
+        'results': results,
+    }
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+def compare(args: argparse.Namespace):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare_results(baseline, current, args.threshold, args.min_seconds)
+    for regression in regressions:
+        print(format_regression(regression))
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}.")
+        sys.exit(1)
+    print("No regressions.")
+
+
+def lex_stress(args: argparse.Namespace):
+    output = benchmark_lexer_stress(args.sizes, args.repeat)
+    print(json.dumps(output, indent=2))
+
+
+def lex_file(args: argparse.Namespace):
+    output = benchmark_large_file(args.megabytes, args.repeat)
+    print(json.dumps(output, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    run_parser = subparsers.add_parser('run', help='times each stage of the pipeline and outputs the results as JSON')
+    run_parser.add_argument('-o', '--output', help='file to write the results to (default: standard output)')
+    run_parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_SIZES,
+                            help='the lengths (in lines) of the generated programs to time')
+    run_parser.add_argument('--repeat', type=int, default=3, help='times to run each program (the best is kept)')
+    run_parser.add_argument('--no-memory', action='store_true', help='skips measuring peak memory use')
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser('compare', help='flags regressions against a saved baseline')
+    compare_parser.add_argument('baseline', help='results of an earlier run')
+    compare_parser.add_argument('current', help='results to check')
+    compare_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                                help='the fraction by which a metric may grow before it counts as a regression')
+    compare_parser.add_argument('--min-seconds', type=float, default=DEFAULT_MIN_SECONDS,
+                                help='stages quicker than this are too noisy to compare times for')
+    compare_parser.set_defaults(func=compare)
+
+    stress_parser = subparsers.add_parser('lex-stress', help='times the lexer over pathological lines of growing lengths')
+    stress_parser.add_argument('--sizes', type=int, nargs='*', default=DEFAULT_STRESS_SIZES,
+                               help='the lengths (in tokens) of the lines to time')
+    stress_parser.add_argument('--repeat', type=int, default=3, help='times to lex each line (the best is kept)')
+    stress_parser.set_defaults(func=lex_stress)
+
+    file_parser = subparsers.add_parser('lex-file', help='times lexing a large generated file')
+    file_parser.add_argument('--megabytes', type=float, default=DEFAULT_MEGABYTES, help='the size of the file to lex')
+    file_parser.add_argument('--repeat', type=int, default=1, help='times to lex the file (the best is kept)')
+    file_parser.set_defaults(func=lex_file)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
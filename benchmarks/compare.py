@@ -0,0 +1,50 @@
+from typing import Any, Dict, List, NamedTuple
+
+
+Regression = NamedTuple('Regression', [('name', str), ('stage', str), ('metric', str), ('baseline', float),
+                                       ('current', float)])
+
+# The metrics compared between runs. Larger values of each are worse.
+METRICS = ['seconds', 'peak_bytes']
+
+# By default, a metric regresses if it grows by more than this fraction of its baseline value.
+DEFAULT_THRESHOLD = 0.1
+# Stages which take less time than this in both runs are too quick to time reliably, so their times are not compared.
+DEFAULT_MIN_SECONDS = 0.001
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = DEFAULT_THRESHOLD,
+                    min_seconds: float = DEFAULT_MIN_SECONDS) -> List[Regression]:
+    """
+    Finds every metric of every stage which is more than `threshold` (as a fraction) worse in the current results than
+    in the baseline. Programs and stages present in only one set of results are not compared, and neither are times
+    below `min_seconds`.
+    """
+    baseline_programs = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        baseline_result = baseline_programs.get(result['name'])
+        if baseline_result is None:
+            continue
+        stages = dict(result['stages'], total=result['total'])
+        baseline_stages = dict(baseline_result['stages'], total=baseline_result['total'])
+        for stage, values in stages.items():
+            baseline_values = baseline_stages.get(stage)
+            if baseline_values is None:
+                continue
+            for metric in METRICS:
+                old = baseline_values.get(metric)
+                new = values.get(metric)
+                if old is None or new is None:
+                    continue
+                if metric == 'seconds' and max(old, new) < min_seconds:
+                    continue
+                if new > old * (1 + threshold):
+                    regressions.append(Regression(result['name'], stage, metric, old, new))
+    return regressions
+
+
+def format_regression(regression: Regression) -> str:
+    change = (regression.current / regression.baseline - 1) * 100 if regression.baseline else float('inf')
+    return (f"{regression.name} [{regression.stage}] {regression.metric}: {regression.baseline:.6g} -> "
+            f"{regression.current:.6g} (+{change:.1f}%)")
@@ -0,0 +1,44 @@
+from os.path import basename, dirname, join
+from glob import glob
+from typing import List, NamedTuple
+
+
+Program = NamedTuple('Program', [('name', str), ('source', str)])
+
+
+VIPER_FILES_DIR = join(dirname(dirname(__file__)), 'tests', 'viper_files')
+
+# The sizes (in lines) of the generated programs timed by default.
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+
+def viper_file_programs() -> List[Program]:
+    programs = []
+    for viper_file in sorted(glob(join(VIPER_FILES_DIR, '*.viper'))):
+        with open(viper_file) as f:
+            programs.append(Program(basename(viper_file), f.read()))
+    return programs
+
+
+def generate_program(lines: int) -> Program:
+    """
+    Generates a program of the given number of lines which the interpreter can run. The program is a series of small
+    function definitions, each followed by an assignment calling it, so that every stage of the pipeline scales with
+    its length.
+    """
+    source_lines: List[str] = []
+    i = 0
+    while len(source_lines) < lines:
+        source_lines.extend([
+            f'def f{i}(a: Int, b: Int) -> Int:',
+            f'    if a == b:',
+            f'        return a * 2',
+            f'    return a + b + {i}',
+            f'x{i} = f{i}({i}, {i} + 1)',
+        ])
+        i += 1
+    del source_lines[lines:]
+    # The last definition may have been cut off before its body.
+    while source_lines and source_lines[-1].endswith(':'):
+        source_lines.pop()
+    return Program(f'generated-{lines}', '\n'.join(source_lines) + '\n')
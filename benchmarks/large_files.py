@@ -0,0 +1,51 @@
+from .corpus import generate_program
+
+from viper.lexer import lex_stream
+
+import os
+import tempfile
+import time
+
+from typing import Any, Dict
+
+
+# The size of the generated file lexed by default.
+DEFAULT_MEGABYTES = 100
+
+
+def write_generated_file(file: str, megabytes: float) -> int:
+    """
+    Writes a generated program of at least the given size to the file, returning its size in bytes. The program is
+    made of copies of a smaller generated program, so it is never held in memory whole.
+    """
+    chunk = generate_program(5000).source.encode()
+    size = 0
+    with open(file, 'wb') as f:
+        while size < megabytes * 2**20:
+            f.write(chunk)
+            size += len(chunk)
+    return size
+
+
+def benchmark_large_file(megabytes: float = DEFAULT_MEGABYTES, repeat: int = 1) -> Dict[str, Any]:
+    """
+    Lexes a generated file of the given size with `lex_stream`, keeping the best time of `repeat` runs. The lexemes are
+    counted as they are produced, so that those of a large file never have to be held at once.
+    """
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file = os.path.join(temp_dir, 'large.viper')
+        size = write_generated_file(file, megabytes)
+        seconds = None
+        lexemes = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            with open(file) as f:
+                lexemes = sum(1 for _ in lex_stream(f))
+            run_seconds = time.perf_counter() - start
+            seconds = run_seconds if seconds is None else min(seconds, run_seconds)
+    return {
+        'bytes': size,
+        'seconds': seconds,
+        'megabytes_per_second': size / 2**20 / seconds if seconds else None,
+        'lexemes': lexemes,
+    }
@@ -0,0 +1,54 @@
+from viper.lexer import LexerError, lex_line
+
+import time
+
+from typing import Any, Callable, Dict, List
+
+
+# Lines which a lexer that backtracks or re-lexes its input would take super-linear time over, each generated with
+# roughly the given number of tokens. None of them have any whitespace.
+PATHOLOGICAL_LINES: Dict[str, Callable[[int], str]] = {
+    'operator-chain': lambda size: '+'.join(f'a{i}' for i in range(size // 2)),
+    'nested-parens': lambda size: 'f(' * (size // 3) + 'x' + ')' * (size // 3),
+    'comma-list': lambda size: 'f(' + ','.join('a' for _ in range(size // 2)) + ')',
+    # An unterminated string cannot be lexed, however many operators and commas follow it.
+    'invalid-tail': lambda size: 'x="' + ',a+' * (size // 3),
+}
+
+# The sizes (in tokens) of the lines timed by default. Each is twice the last, so that linear lexing shows up as a
+# constant time per character.
+DEFAULT_STRESS_SIZES = [1000, 2000, 4000, 8000, 16000]
+
+
+def benchmark_lexer_stress(sizes: List[int] = DEFAULT_STRESS_SIZES, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Times `lex_line` over each pathological line at each size, keeping the best of `repeat` runs. Alongside the times,
+    the result gives the scaling of each kind of line: its time per character at the largest size divided by that at
+    the smallest. This stays near 1 if lexing is linear, and grows with the sizes if it is not.
+    """
+    results = []
+    scaling = {}
+    for name, make_line in PATHOLOGICAL_LINES.items():
+        per_char = []
+        for size in sizes:
+            line = make_line(size)
+            seconds = min(_time_lex_line(line) for _ in range(repeat))
+            per_char.append(seconds / len(line))
+            results.append({
+                'name': name,
+                'size': size,
+                'chars': len(line),
+                'seconds': seconds,
+                'seconds_per_char': per_char[-1],
+            })
+        scaling[name] = per_char[-1] / per_char[0] if per_char and per_char[0] else None
+    return {'results': results, 'scaling': scaling}
+
+
+def _time_lex_line(line: str) -> float:
+    start = time.perf_counter()
+    try:
+        lex_line(line)
+    except LexerError:
+        pass
+    return time.perf_counter() - start
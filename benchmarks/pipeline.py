@@ -0,0 +1,112 @@
+from .corpus import Program
+
+from viper.interpreter import start_eval
+from viper.lexer import clear_interned_lexemes, lex_lines
+from viper.parser import GRAMMAR, SingleParse
+from viper.parser.grammar import Grammar
+from viper.parser.languages import collapse_parse, parse_null
+
+import time
+import tracemalloc
+
+from typing import Any, Callable, Dict, List, Optional
+
+
+# The stages of the pipeline, in the order in which they are run.
+STAGES = ['lex', 'derive', 'parse_null', 'collapse_parse', 'eval']
+
+
+def benchmark_program(program: Program, repeat: int = 3, memory: bool = True) -> Dict[str, Any]:
+    """
+    Runs a program through the pipeline `repeat` times, timing each stage separately. The best time of each stage is
+    reported, along with its throughput in tokens per second. With `memory`, the pipeline is run once more under
+    `tracemalloc` to find the peak memory use of each stage (this is kept out of the timed runs, as tracing is slow).
+    """
+    seconds: Dict[str, float] = {}
+    for _ in range(repeat):
+        run_seconds, _, tokens, parsed = _run_pipeline(program)
+        for stage, stage_seconds in run_seconds.items():
+            seconds[stage] = min(seconds.get(stage, stage_seconds), stage_seconds)
+    peaks: Dict[str, Optional[int]] = {stage: None for stage in seconds}
+    if memory:
+        tracemalloc.start()
+        try:
+            _, peaks, _, _ = _run_pipeline(program, traced=True)
+        finally:
+            tracemalloc.stop()
+    stages = {}
+    for stage in STAGES:
+        if stage not in seconds:
+            continue
+        stages[stage] = {
+            'seconds': seconds[stage],
+            'tokens_per_second': tokens / seconds[stage] if seconds[stage] else None,
+            'peak_bytes': peaks.get(stage),
+        }
+    total_seconds = sum(seconds.values())
+    return {
+        'name': program.name,
+        'lines': program.source.count('\n'),
+        'tokens': tokens,
+        'parsed': parsed,
+        'stages': stages,
+        'total': {
+            'seconds': total_seconds,
+            'tokens_per_second': tokens / total_seconds if total_seconds else None,
+            'peak_bytes': max((peak for peak in peaks.values() if peak is not None), default=None),
+        },
+    }
+
+
+def _run_pipeline(program: Program, traced: bool = False):
+    """
+    Runs a program through each stage once, returning the seconds (and, if `traced`, the peak bytes allocated) of each
+    stage, the number of tokens, and whether the program parsed. The evaluation stage is skipped if it did not.
+    """
+    seconds: Dict[str, float] = {}
+    peaks: Dict[str, int] = {}
+
+    def run_stage(stage: str, func: Callable[[], Any]) -> Any:
+        if traced:
+            _reset_peak()
+            start_size = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = func()
+        seconds[stage] = time.perf_counter() - start
+        if traced:
+            peaks[stage] = tracemalloc.get_traced_memory()[1] - start_size
+        return result
+
+    # Each run starts from an empty derivative cache and intern table, as a fresh interpreter would.
+    GRAMMAR.derivatives.clear()
+    clear_interned_lexemes()
+    lexemes = run_stage('lex', lambda: lex_lines(program.source))
+    state = GRAMMAR.parser_state('file_input')
+    run_stage('derive', lambda: state.feed_all(lexemes))
+    forest = run_stage('parse_null', lambda: parse_null(state.lang))
+    sppf = run_stage('collapse_parse', lambda: collapse_parse(forest))
+    parse = Grammar.parse_from_sppf(sppf)
+    parsed = isinstance(parse, SingleParse)
+    if parsed:
+        run_stage('eval', lambda: start_eval(parse.ast))
+    return seconds, peaks, len(lexemes), parsed
+
+
+def benchmark_programs(programs: List[Program], repeat: int = 3, memory: bool = True,
+                       log: Optional[Callable[[str], None]] = None) -> List[Dict[str, Any]]:
+    results = []
+    for program in programs:
+        if log is not None:
+            log(f"Running {program.name}...")
+        results.append(benchmark_program(program, repeat, memory))
+    return results
+
+
+def _reset_peak():
+    # `tracemalloc.reset_peak` is new in Python 3.9. Before then, tracing is restarted instead: this forgets the blocks
+    # allocated so far, so the stage's peak is measured from zero rather than from the memory already in use.
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.stop()
+        tracemalloc.start()
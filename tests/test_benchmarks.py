@@ -0,0 +1,49 @@
+from benchmarks.compare import compare_results
+from benchmarks.corpus import generate_program
+from benchmarks.large_files import benchmark_large_file
+from benchmarks.lexer_stress import PATHOLOGICAL_LINES, benchmark_lexer_stress
+from benchmarks.pipeline import STAGES, benchmark_program
+
+import pytest
+
+
+@pytest.mark.parametrize('lines', [1, 7, 10])
+def test_generated_programs_run(lines: int):
+    program = generate_program(lines)
+    result = benchmark_program(program, repeat=1)
+    assert result['parsed']
+    assert list(result['stages']) == STAGES
+    assert all(stage['peak_bytes'] is not None for stage in result['stages'].values())
+
+
+def test_memory_is_measured_without_reset_peak(monkeypatch):
+    # Python 3.8 and earlier have no `tracemalloc.reset_peak`.
+    monkeypatch.delattr('tracemalloc.reset_peak', raising=False)
+    result = benchmark_program(generate_program(7), repeat=1)
+    assert all(stage['peak_bytes'] > 0 for stage in result['stages'].values())
+
+
+def _results(**seconds):
+    return {'results': [{'name': 'program', 'stages': {stage: {'seconds': value, 'peak_bytes': 100}
+                                                       for stage, value in seconds.items()},
+                         'total': {'seconds': sum(seconds.values()), 'peak_bytes': 100}}]}
+
+
+def test_compare_flags_regressions():
+    baseline = _results(lex=1.0, derive=2.0, eval=0.0001)
+    current = _results(lex=1.05, derive=3.0, eval=0.0005)
+    regressions = compare_results(baseline, current, threshold=0.1)
+    assert [(regression.stage, regression.metric) for regression in regressions] == [('derive', 'seconds'),
+                                                                                      ('total', 'seconds')]
+
+
+def test_lexer_stress():
+    output = benchmark_lexer_stress(sizes=[10, 20], repeat=1)
+    assert len(output['results']) == 2 * len(PATHOLOGICAL_LINES)
+    assert set(output['scaling']) == set(PATHOLOGICAL_LINES)
+
+
+def test_large_file():
+    output = benchmark_large_file(megabytes=0.01)
+    assert output['bytes'] >= 0.01 * 2**20
+    assert output['lexemes'] > 0 and output['megabytes_per_second'] > 0
@@ -1,12 +1,17 @@
+from viper.formal_grammar import GRAMMAR_FILE
 from viper.lexer import lex_line, lex_lines
 from viper.parser import *
 from viper.parser.ast.ast_to_string import ast_to_string
+from viper.parser.grammar import Grammar, split_file_lines
+from viper.parser.grammar_cache import grammar_cache_key, grammar_cache_path
 
 import viper.lexer as vl
 import viper.parser.ast.nodes as ns
 
 import os
 import pytest
+import subprocess
+import sys
 
 from importlib import import_module
 from typing import List
@@ -536,3 +541,88 @@ def test_files(viper_file: str, module_name: str):
     tree = module.tree
     lexemes = vl.lex_file(viper_file)
     run_test('file_input', tree, lexemes, [], [])
+
+
+def _viper_files():
+    viper_files_dir = os.path.join(os.path.dirname(__file__), 'viper_files')
+    return [os.path.join(viper_files_dir, file) for file in sorted(os.listdir(viper_files_dir))
+            if file.endswith('.viper')]
+
+
+@pytest.mark.parametrize('viper_file', _viper_files())
+def test_parallel_parse_file(viper_file: str):
+    lexemes = vl.lex_file(viper_file)
+    serial = GRAMMAR.parse_file(lexemes)
+    parallel = GRAMMAR.parse_file(lexemes, parallel=True, max_workers=2)
+    assert type(parallel) == type(serial)
+    if isinstance(serial, SingleParse):
+        assert parallel.ast == serial.ast
+
+
+def test_serial_parsing_does_not_import_process_pools():
+    code = 'import sys, viper.parser; print("concurrent.futures" in sys.modules)'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', code], cwd=root, stdout=subprocess.PIPE, check=True).stdout
+    assert output.strip() == b'False'
+
+
+def test_split_file_lines_keeps_compound_statements_whole():
+    lexemes = lex_lines('x = 1\nif x:\n    pass\nelse:\n    pass\ny = 2\n')
+    chunks = split_file_lines(lexemes)
+    assert [chunk[0] for chunk in chunks] == [vl.Name('x'), vl.ReservedName('if'), vl.Name('y')]
+    assert sum(map(len, chunks)) == len(lexemes) - 1
+
+
+@pytest.mark.parametrize('line,position,expected', [
+    ('foo )', 1, vl.OPEN_PAREN),
+    ('foo(', 2, vl.CLOSE_PAREN),
+    ('foo.', 2, vl.Name('bar')),
+])
+def test_no_parse_position(line: str, position: int, expected: vl.Lexeme):
+    parse = GRAMMAR.parse_rule('expr', lex_line(line))
+    assert isinstance(parse, NoParse)
+    assert parse.position == position
+    assert expected in parse.expected
+
+
+###############################################################################
+#
+# GRAMMAR CACHE
+#
+###############################################################################
+
+
+def _copy_grammar_file(directory) -> str:
+    grammar_file = os.path.join(str(directory), 'formal_grammar.vgf')
+    with open(GRAMMAR_FILE) as src, open(grammar_file, 'w') as dst:
+        dst.write(src.read())
+    return grammar_file
+
+
+def test_grammar_cache_round_trip(tmpdir, monkeypatch):
+    grammar_file = _copy_grammar_file(tmpdir)
+    built = Grammar(grammar_file, use_cache=True)
+    assert os.path.isfile(grammar_cache_path(grammar_file))
+
+    def fail(*args):
+        raise AssertionError("the grammar should have been loaded from the cache")
+
+    monkeypatch.setattr('viper.parser.grammar_cache.linguify_grammar_file', fail)
+    loaded = Grammar(grammar_file, cache_size=8, use_cache=True)
+    assert loaded.derivatives.max_size == 8
+    assert sorted(loaded.rules) == sorted(built.rules)
+    lexemes = vl.lex_file(os.path.join(os.path.dirname(__file__), 'viper_files', 'fib.viper'))
+    assert str(loaded.sppf_from_rule('file_input', lexemes)) == str(built.sppf_from_rule('file_input', lexemes))
+
+
+def test_grammar_cache_is_rebuilt_when_grammar_changes(tmpdir):
+    grammar_file = _copy_grammar_file(tmpdir)
+    Grammar(grammar_file, use_cache=True)
+    with open(grammar_cache_path(grammar_file), 'rb') as f:
+        old_key = f.readline()
+    with open(grammar_file, 'a') as f:
+        f.write('\n')
+    assert grammar_cache_key(grammar_file).encode() + b'\n' != old_key
+    Grammar(grammar_file, use_cache=True)
+    with open(grammar_cache_path(grammar_file), 'rb') as f:
+        assert f.readline() == grammar_cache_key(grammar_file).encode() + b'\n'
@@ -0,0 +1,504 @@
+from viper.parser.languages import *
+
+import viper.lexer as vl
+
+import os
+import pickle
+import sys
+import pytest
+
+from viper.parser import GRAMMAR
+from viper.parser.grammar_parsing.tokenize.special_tokens import SPECIAL_TOKENS
+
+
+###############################################################################
+#
+# COMPACTION
+#
+###############################################################################
+
+
+class _AppendRedFunc(RedFunc):
+    def __init__(self, token):
+        self.token = token
+
+    def make_nice_string(self, start_column: int) -> str:
+        return repr(self.token)
+
+    def __call__(self, sppf: SPPF) -> SPPF:
+        return SPPF(ParseTreePair(sppf, SPPF(ParseTreeChar(self.token))))
+
+
+def test_compact_fuses_reductions():
+    f = _AppendRedFunc('f')
+    g = _AppendRedFunc('g')
+    lang = red(red(literal(vl.Name('foo')), f), g)
+    compacted = compact(lang)
+    assert isinstance(compacted, Red)
+    assert isinstance(compacted.lang, Literal)
+    assert parse_null(derive(compacted, vl.Name('foo'))) == parse_null(derive(lang, vl.Name('foo')))
+
+
+def test_compact_drops_empty_branches():
+    lang = red(alt(Concat(literal(vl.Name('foo')), empty()), literal(vl.Name('bar'))), _AppendRedFunc('f'))
+    compacted = compact(lang)
+    assert isinstance(compacted, Red)
+    assert isinstance(compacted.lang, Literal)
+
+
+def test_compact_collapses_epsilon_concatenation():
+    lang = Concat(red(eps(lambda: SPPF(ParseTreeEps())), _AppendRedFunc('f')), literal(vl.Name('foo')))
+    compacted = compact(lang)
+    assert isinstance(compacted, Red)
+    assert parse_null(derive(compacted, vl.Name('foo'))) == parse_null(derive(lang, vl.Name('foo')))
+
+
+def _viper_files():
+    viper_files_dir = os.path.join(os.path.dirname(__file__), 'viper_files')
+    return [os.path.join(viper_files_dir, file) for file in sorted(os.listdir(viper_files_dir))
+            if file.endswith('.viper')]
+
+
+@pytest.mark.parametrize('viper_file', _viper_files())
+def test_compaction_preserves_sppf(viper_file: str):
+    lexemes = vl.lex_file(viper_file)
+    compacted = GRAMMAR.sppf_from_rule('file_input', lexemes)
+    uncompacted = GRAMMAR.sppf_from_rule('file_input', lexemes, compaction=False)
+    assert str(compacted) == str(uncompacted)
+
+
+###############################################################################
+#
+# NULLABILITY AND EMPTINESS
+#
+###############################################################################
+
+
+def _make_cyclic_rules():
+    rules = {}
+    # <left> ::= <left> 'x' | ε
+    rules['left'] = alt(concat(rule_literal('left', rules), literal(vl.Name('x'))),
+                        eps(lambda: SPPF(ParseTreeEps())))
+    # <right> ::= 'x' <right>
+    rules['right'] = concat(literal(vl.Name('x')), rule_literal('right', rules))
+    # <loop> ::= <loop> | <right>
+    rules['loop'] = alt(rule_literal('loop', rules), rule_literal('right', rules))
+    return rules
+
+
+@pytest.mark.parametrize('rule,nullable,empty_lang', [
+    ('left', True, False),
+    ('right', False, True),
+    ('loop', False, True),
+])
+def test_cyclic_rule_analysis(rule: str, nullable: bool, empty_lang: bool):
+    lang = rule_literal(rule, _make_cyclic_rules())
+    assert is_nullable(lang) == nullable
+    assert is_empty_language(lang) == empty_lang
+    # The results are cached on the node.
+    assert lang._nullable == nullable
+    assert lang._empty == empty_lang
+
+
+def test_replacing_a_rule_clears_analyses():
+    rules = RuleDict()
+    rules['a'] = eps(null_parse)
+    rules['b'] = concat(rule_literal('a', rules), literal(vl.Name('x')))
+    rules.compute_first_sets()
+    assert is_nullable(rule_literal('a', rules))
+    assert (vl.Name.terminal_id, 'x') in rules['b']._first
+    rules['a'] = literal(vl.Name('y'))
+    assert not is_nullable(rule_literal('a', rules))
+    assert not ParserState(rule_literal('a', rules)).is_accepting()
+    assert rules['b']._first == {(vl.Name.terminal_id, 'y')}
+
+
+def test_derive_empty_language():
+    lang = rule_literal('right', _make_cyclic_rules())
+    assert isinstance(derive(lang, vl.Name('x')), Empty)
+
+
+###############################################################################
+#
+# HASH-CONSING
+#
+###############################################################################
+
+
+def test_hash_consing_shares_structure():
+    rules = {}
+    foo = literal(vl.Name('foo'))
+    assert literal(vl.Name('foo')) is foo
+    assert literal(vl.Name('bar')) is not foo
+    assert concat(foo, rule_literal('rule', rules)) is concat(foo, rule_literal('rule', rules))
+    assert alt(foo, literal(vl.Name('bar'))) is alt(foo, literal(vl.Name('bar')))
+    assert rep(foo) is rep(foo)
+    assert delay(rule_literal('rule', rules), vl.Name('foo')) is delay(rule_literal('rule', rules), vl.Name('foo'))
+    assert rule_literal('rule', rules) is not rule_literal('rule', {})
+
+
+def test_hash_consed_equality_is_identity():
+    func = ListRepRedFunc()
+    lang = red(literal(vl.Name('foo')), func)
+    assert lang == red(literal(vl.Name('foo')), func)
+    assert lang != red(literal(vl.Name('foo')), ListRepRedFunc())
+    assert hash(lang) == hash(red(literal(vl.Name('foo')), func))
+
+
+def test_empty_is_shared():
+    assert empty() is empty()
+    assert derive(literal(vl.Name('x')), vl.Name('y')) is empty()
+
+
+def test_epsilon_value_is_computed_once():
+    calls = []
+
+    def func():
+        calls.append(None)
+        return SPPF(ParseTreeChar('x'))
+
+    lang = eps(func)
+    assert parse_null(lang) is parse_null(lang)
+    assert len(calls) == 1
+
+
+def test_literals_matching_a_token_share_its_epsilon():
+    token = vl.Name('x')
+    first = derive(literal(vl.Name('x')), token)
+    second = derive(literal(vl.Lexeme('x')), token)
+    assert first is second
+    assert first.func is None and first.value[0].token is token
+
+
+###############################################################################
+#
+# NODE KINDS
+#
+###############################################################################
+
+
+def test_node_kinds_are_unique():
+    lang_kinds = [cls.kind for cls in (Empty, Epsilon, Literal, RuleLiteral, DelayRule, Concat, Alt, Rep, Red,
+                                             TokenEpsilon, Bind)]
+    tree_kinds = [cls.kind for cls in (ParseTreeEmpty, ParseTreeEps, ParseTreeChar, ParseTreePair, ParseTreeRep)]
+    assert len(set(lang_kinds)) == len(lang_kinds)
+    assert len(set(tree_kinds)) == len(tree_kinds)
+    assert None not in lang_kinds and None not in tree_kinds
+
+
+def test_nodes_use_slots():
+    rules = RuleDict()
+    rules['rule'] = literal(vl.Name('x'))
+    rule = rule_literal('rule', rules)
+    langs = [empty(), eps(null_parse), literal(vl.Name('x')), rule, delay(rule, vl.Name('x')),
+             concat(rule, rule), alt(rule, literal(vl.Name('y'))), rep(rule), red(rule, ListRepRedFunc()), token_eps(),
+             bind(rule, vl.Name('x'))]
+    trees = [ParseTreeEmpty(), ParseTreeEps(), ParseTreeChar('x'), ParseTreePair(SPPF(), SPPF()),
+             ParseTreeRep(SPPF())]
+    for item in langs + trees + [SPPF()]:
+        assert not hasattr(item, '__dict__'), type(item)
+
+
+def test_slotted_nodes_pickle():
+    lang = pickle.loads(pickle.dumps(GRAMMAR.rules))['expr']
+    tokens = vl.lex_line('foo.bar(1)')
+    sppf = make_sppf(lang, tokens)
+    assert str(sppf) == str(GRAMMAR.sppf_from_rule('expr', tokens))
+    assert str(pickle.loads(pickle.dumps(sppf))) == str(sppf)
+
+
+###############################################################################
+#
+# DERIVATIVE CACHE
+#
+###############################################################################
+
+
+def _make_cached_rules(cache_size):
+    rules = RuleDict(cache_size)
+    rules['name'] = literal(vl.Name('foo'))
+    return rules
+
+
+def test_derivative_cache_hits_and_misses():
+    rules = _make_cached_rules(None)
+    lang = rule_literal('name', rules)
+    foo = vl.Name('foo')
+    first = derive(lang, foo)
+    assert derive(lang, foo) is first
+    stats = rules.derivatives.stats()
+    assert (stats.size, stats.hits, stats.misses, stats.evictions) == (1, 1, 1, 0)
+
+
+def test_derivative_cache_evicts_least_recently_used():
+    rules = _make_cached_rules(2)
+    lang = rule_literal('name', rules)
+    for token in (vl.Name('foo'), vl.Int('1'), vl.Name('foo'), vl.Float('1.0')):
+        derive(lang, token)
+    stats = rules.derivatives.stats()
+    assert (stats.size, stats.hits, stats.misses, stats.evictions) == (2, 1, 3, 1)
+    assert (lang, rules.terminal_kind(vl.Name('foo'))) in rules.derivatives
+    assert (lang, rules.terminal_kind(vl.Int('1'))) not in rules.derivatives
+
+
+def test_derivative_cache_clear():
+    rules = _make_cached_rules(None)
+    derive(rule_literal('name', rules), vl.Name('foo'))
+    rules.derivatives.clear()
+    assert len(rules.derivatives) == 0
+
+
+def test_literals_match_by_terminal_id():
+    name_token = literal(SPECIAL_TOKENS['NAME'])
+    assert name_token.matches(vl.Name('foo'))
+    assert not name_token.matches(vl.Int('1'))
+    # Plain lexemes match any kind of token with their text, but subclasses also require their kind.
+    assert literal(vl.Lexeme('foo')).matches(vl.Name('foo'))
+    assert not literal(vl.Lexeme('foo')).matches(vl.Name('bar'))
+    assert literal(vl.Name('foo')).matches(vl.Name('foo'))
+    assert not literal(vl.Int('1')).matches(vl.Name('1'))
+
+
+###############################################################################
+#
+# TERMINAL KINDS
+#
+###############################################################################
+
+
+def _make_name_list_rules():
+    rules = RuleDict()
+    # <names> ::= NAME <names> | 'foo' | ε
+    rules['names'] = alt(concat(literal(SPECIAL_TOKENS['NAME']), rule_literal('names', rules)),
+                         literal(vl.Lexeme('foo')),
+                         eps(lambda: SPPF(ParseTreeEps())))
+    return rules
+
+
+def test_terminal_kinds_hide_unmatched_text():
+    rules = _make_name_list_rules()
+    assert rules.terminal_kind(vl.Name('bar')) is rules.terminal_kind(vl.Name('baz'))
+    assert rules.terminal_kind(vl.Name('foo')) is not rules.terminal_kind(vl.Name('bar'))
+    assert rules.terminal_kind(vl.Int('1')) is not rules.terminal_kind(vl.Name('bar'))
+
+
+def test_terminal_kinds_share_derivatives():
+    rules = _make_name_list_rules()
+    tokens = [vl.Name('a'), vl.Name('b'), vl.Name('c')]
+    sppf = make_sppf(rule_literal('names', rules), tokens)
+    stats = rules.derivatives.stats()
+    assert (stats.size, stats.misses) == (1, 1)
+    # Each leaf still holds the token it was derived from.
+    leaves = []
+    trees = list(sppf)
+    while trees:
+        tree = trees.pop()
+        if tree.kind == TREE_CHAR_KIND:
+            leaves.append(tree.token)
+        elif tree.kind == TREE_PAIR_KIND:
+            trees.extend(tree.left)
+            trees.extend(tree.right)
+    assert sorted(leaf.text for leaf in leaves) == ['a', 'b', 'c']
+    assert all(any(leaf is token for token in tokens) for leaf in leaves)
+
+
+###############################################################################
+#
+# FIRST SETS
+#
+###############################################################################
+
+
+def test_first_sets():
+    rules = _make_name_list_rules()
+    rules.compute_first_sets()
+    assert rules['names']._first == {(vl.Name.terminal_id, None), (0, 'foo')}
+    assert rule_literal('names', rules)._first == rules['names']._first
+    # Literals which are not lexemes could match anything.
+    rules['other'] = alt(literal('x'), rule_literal('names', rules))
+    assert rules['other']._first is None
+    assert rules['names']._first is not None
+
+
+def test_first_sets_prune_alternatives():
+    tokens = [vl.Name('a'), vl.Name('b')]
+    rules = _make_name_list_rules()
+    with parser_stats() as unpruned:
+        unpruned_sppf = make_sppf(rule_literal('names', rules), tokens)
+    rules.compute_first_sets()
+    rules.derivatives.clear()
+    with parser_stats() as pruned:
+        pruned_sppf = make_sppf(rule_literal('names', rules), tokens)
+    assert str(pruned_sppf) == str(unpruned_sppf)
+    # The alternatives beginning with 'foo' are never derived.
+    assert sum(pruned.derives) < sum(unpruned.derives)
+
+
+def test_first_sets_survive_pickling(monkeypatch):
+    data = pickle.dumps(GRAMMAR.rules)
+
+    def fail(self):
+        raise AssertionError("the FIRST sets should have been unpickled")
+
+    monkeypatch.setattr(RuleDict, 'compute_first_sets', fail)
+    rules = pickle.loads(data)
+    assert rules['expr']._first is not None
+    assert rules['expr']._first == GRAMMAR.rules['expr']._first
+
+
+###############################################################################
+#
+# PARSE FORESTS
+#
+###############################################################################
+
+
+def test_sppf_union_packs_without_copying():
+    a = SPPF(ParseTreeChar('a'))
+    b = SPPF(ParseTreeChar('b'), ParseTreeChar('c'))
+    union = a + b
+    assert union._packed == [a, b]
+    assert [tree.token for tree in union] == ['a', 'b', 'c']
+    assert union._packed is None
+    # The operands are shared, not copied.
+    assert a._trees == [ParseTreeChar('a')] and len(b) == 2
+
+
+def test_ambiguous_parse_packs_each_tree_once(monkeypatch):
+    # <amb> ::= 'a' | 'a' | ... with a different parse for each alternative, which parse_null packs into a chain of
+    # unions. Checking whether the unions are empty must not gather their trees, or every tree is copied into every
+    # union after it, which takes quadratic time and memory.
+    size = 500
+    lang = empty()
+    for i in reversed(range(size)):
+        lang = alt(red(literal(vl.Name('a')), RightEpsRedFunc(SPPF(ParseTreeChar(i)))), lang)
+    gathered = []
+    unpack = SPPF._unpack
+
+    def counting_unpack(self):
+        unpack(self)
+        gathered.append(len(self._trees))
+
+    monkeypatch.setattr(SPPF, '_unpack', counting_unpack)
+    sppf = parse_null(derive(lang, vl.Name('a')))
+    assert len(sppf) == size
+    assert sum(gathered) == 0
+    assert len(list(sppf)) == size
+    assert sum(gathered) == size
+
+
+def test_sppf_deep_union():
+    forest = SPPF()
+    for i in range(3 * sys.getrecursionlimit()):
+        forest = forest + SPPF(ParseTreeChar(i))
+    assert [tree.token for tree in forest][:3] == [0, 1, 2]
+
+
+###############################################################################
+#
+# DEEP LANGUAGES
+#
+###############################################################################
+
+
+_DEPTH = 3 * sys.getrecursionlimit()
+
+
+def test_deep_concatenation():
+    x = literal(vl.Name('x'))
+    lang = x
+    for _ in range(_DEPTH):
+        lang = concat(x, lang)
+    assert repr(lang).count('x') == _DEPTH + 1
+    sppf = make_sppf(lang, [vl.Name('x')] * (_DEPTH + 1))
+    assert len(sppf) == 1
+    assert str(sppf).count('(char Name(x))') == _DEPTH + 1
+
+
+def test_deep_reductions():
+    lang = literal(vl.Name('x'))
+    for _ in range(_DEPTH):
+        lang = red(lang, _AppendRedFunc('f'))
+    derivative = derive(lang, vl.Name('x'))
+    compacted = compact(derivative)
+    assert compacted.kind == EPSILON_KIND
+    assert str(parse_null(compacted)) == str(parse_null(derivative))
+    assert str(collapse_parse(parse_null(derivative))).count("(char 'f')") == _DEPTH
+
+
+###############################################################################
+#
+# INCREMENTAL PARSING
+#
+###############################################################################
+
+
+@pytest.mark.parametrize('viper_file', _viper_files())
+def test_parser_state_matches_make_sppf(viper_file: str):
+    lexemes = vl.lex_file(viper_file)
+    state = GRAMMAR.parser_state('file_input')
+    for lexeme in lexemes:
+        state.feed(lexeme)
+    assert state.position == len(lexemes)
+    assert str(state.results()) == str(GRAMMAR.sppf_from_rule('file_input', lexemes))
+
+
+def test_parser_state_checkpoints():
+    state = GRAMMAR.parser_state('expr')
+    state.feed(vl.Name('foo'))
+    assert state.is_accepting()
+    checkpoint = state.checkpoint()
+    state.feed(vl.OPEN_PAREN)
+    assert state.is_viable() and not state.is_accepting()
+    state.feed(vl.CLOSE_PAREN)
+    state.feed(vl.CLOSE_PAREN)
+    assert not state.is_viable()
+    state.restore(checkpoint)
+    assert state.position == 1
+    state.feed(vl.PERIOD)
+    state.feed(vl.Name('bar'))
+    assert state.is_accepting()
+    assert str(state.results()) == str(GRAMMAR.sppf_from_rule('expr', vl.lex_line('foo.bar')))
+
+
+def test_parser_state_stops_at_failure():
+    rules = _make_name_list_rules()
+    state = ParserState(rule_literal('names', rules))
+    state.feed_all([vl.Name('a'), vl.Int('1'), vl.Name('b')])
+    assert state.failure.position == 1
+    assert state.failure.expected == [SPECIAL_TOKENS['NAME'], vl.Lexeme('foo')]
+    # Tokens after the failure are not fed in.
+    assert state.position == 2
+    assert not state.is_viable()
+
+
+def test_first_terminals_skip_empty_alternatives():
+    # <loop> can only begin with 'x', but never finishes, so it expects nothing.
+    assert first_terminals(rule_literal('loop', _make_cyclic_rules())) == []
+    assert first_terminals(rule_literal('left', _make_cyclic_rules())) == [vl.Name('x')]
+
+
+###############################################################################
+#
+# PARSER STATISTICS
+#
+###############################################################################
+
+
+def test_parser_stats_counts_work():
+    rules = _make_name_list_rules()
+    with parser_stats() as stats:
+        make_sppf(rule_literal('names', rules), [vl.Name('a'), vl.Name('b')])
+    assert stats.tokens == 2
+    assert (stats.cache_hits, stats.cache_misses) == (1, 1)
+    assert stats.delay_forcings == 1
+    assert stats.derives_by_kind()['RuleLiteral'] >= 2
+    assert stats.nodes_allocated > 0 and stats.parse_null_calls > 0
+    assert 'cache misses' in stats.report()
+
+
+def test_parser_stats_are_only_collected_inside_the_block():
+    with parser_stats() as stats:
+        pass
+    make_sppf(rule_literal('names', _make_name_list_rules()), [vl.Name('a')])
+    assert stats.tokens == 0 and sum(stats.derives) == 0 and stats.nodes_allocated == 0
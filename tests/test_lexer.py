@@ -1,9 +1,12 @@
 import viper.lexer as vl
 
+import io
 import os
+import pickle
 import pytest
 
 from importlib import import_module
+from itertools import count, islice
 from typing import List, Type
 
 
@@ -176,6 +179,34 @@ def test_commas(line: str, correct_lexemes: List[vl.Lexeme]):
     assert vl.lex_line(line) == correct_lexemes
 
 
+# SPECIAL CASES
+
+@pytest.mark.parametrize('line,correct_lexemes', [
+    ('def foo() -> Int: ...',
+     [vl.ReservedName('def'), vl.Name('foo'), vl.OPEN_PAREN, vl.CLOSE_PAREN, vl.R_ARROW, vl.Class('Int'), vl.COLON,
+      vl.ELLIPSIS]),
+    ('x.y = -1.5',
+     [vl.Name('x'), vl.PERIOD, vl.Name('y'), vl.EQUALS, vl.Float('-1.5')]),
+    ('print("a, b" ,"")',
+     [vl.Name('print'), vl.OPEN_PAREN, vl.String('a, b'), vl.COMMA, vl.String(''), vl.CLOSE_PAREN]),
+])
+def test_special_lexemes(line: str, correct_lexemes: List[vl.Lexeme]):
+    lexemes = vl.lex_line(line)
+    assert lexemes == correct_lexemes
+    assert [type(lexeme) for lexeme in lexemes] == [type(lexeme) for lexeme in correct_lexemes]
+
+
+def test_long_invalid_line():
+    with pytest.raises(vl.LexerError):
+        vl.lex_line('"' + ',foo+' * 5000)
+
+
+def test_long_line():
+    lexemes = vl.lex_line(' + '.join(['foo'] * 5000))
+    assert len(lexemes) == 9999
+    assert lexemes[-2:] == [vl.Operator('+'), vl.Name('foo')]
+
+
 ###############################################################################
 #
 # LEXING TEXT
@@ -204,6 +235,93 @@ def test_multiple_lines(text: str, correct_lexemes: List[vl.Lexeme]):
     assert vl.lex_lines(text) == correct_lexemes
 
 
+# STREAMING
+
+def test_lex_stream_matches_lex_lines():
+    text = '# comment\ndef foo():\r\n    x = 1\n\n        y\x0cz\n'
+    assert list(vl.lex_stream(io.StringIO(text))) == vl.lex_lines(text)
+
+
+def test_lex_stream_is_lazy():
+    # The lines never end, so this only finishes if lexemes are produced as the lines are read.
+    lines = ('x = 1\n' for _ in count())
+    assert list(islice(vl.lex_stream(lines), 5)) == [vl.Name('x'), vl.EQUALS, vl.Int('1'), vl.NEWLINE, vl.Name('x')]
+
+
+# TOKEN BUFFERS
+
+def test_lex_line_spans():
+    spans = []
+    lexemes = vl.lex_line('f(x,  "s")', spans)
+    assert len(spans) == len(lexemes)
+    assert spans == [(0, 1), (1, 2), (2, 3), (3, 4), (6, 9), (9, 10)]
+
+
+def test_token_buffer_spans():
+    text = 'def f(a):\n    return  "s"\n'
+    tokens = vl.lex_buffer(text)
+    assert tokens.lexemes() == vl.lex_lines(text)
+    spans = {repr(tokens[i]): tokens.span(i) for i in range(len(tokens))}
+    assert spans['Name(f)'] == vl.Span(1, 4, 4, 5)
+    assert spans['String(s)'] == vl.Span(2, 12, 22, 25)
+    assert text[22:25] == '"s"'
+    # Indents are placed at the start of the token after them, and newlines at the end of the token before them.
+    assert spans['Indent'] == vl.Span(2, 4, 14, 14)
+    assert tokens.span(6) == vl.Span(1, 9, 9, 9)
+    assert tokens.span(len(tokens) - 1) == vl.Span(3, 0, len(text), len(text))
+
+
+def test_token_buffer_matches_files():
+    viper_files_dir = os.path.join(os.path.dirname(__file__), 'viper_files')
+    for viper_file in os.listdir(viper_files_dir):
+        with open(os.path.join(viper_files_dir, viper_file)) as f:
+            text = f.read()
+        tokens = vl.lex_buffer(text)
+        assert tokens.lexemes() == vl.lex_lines(text)
+        assert all(text[tokens.offsets[i]:tokens.ends[i]] == tokens[i].text
+                   for i in range(len(tokens)) if isinstance(tokens[i], (vl.Name, vl.Int, vl.Operator)))
+
+
+# INCREMENTAL LEXING
+
+@pytest.mark.parametrize('text,start,end,replacement', [
+    ('def f(a):\n    return a\n', (1, 11), (1, 12), 'b + c'),
+    # Indenting a line changes the indents before it and the dedents after it.
+    ('if a:\n    b\nc\nd\n', (2, 0), (2, 0), '    '),
+    ('if a:\n    if b:\n        c\nd\n', (2, 0), (2, 4), ''),
+    # Blank lines between the edit and the next line do not count towards indentation.
+    ('if a:\n    b\n\n   \n    c\n', (1, 0), (1, 4), ''),
+    # Edits at the end of the text change the dedents before the end marker.
+    ('if a:\n    b', (1, 5), (1, 5), '\n        c'),
+    ('if a:\n    b\n', (0, 0), (2, 0), 'x'),
+    ('x\ny\nz', (0, 1), (2, 0), ''),
+    ('', (0, 0), (0, 0), '# comment\n\ndef f():\n    pass\n'),
+    # A carriage return and a line feed which come together make one line ending.
+    ('a\r\n', (1, 0), (1, 0), '\nb'),
+])
+def test_incremental_edit(text: str, start, end, replacement: str):
+    lexer = vl.IncrementalLexer(text)
+    assert lexer.tokens == vl.lex_lines(text)
+    lexer.edit(start, end, replacement)
+    assert lexer.tokens == vl.lex_lines(lexer.text)
+    lines = text.splitlines(keepends=True) + ['']
+    offset = lambda line, column: sum(map(len, lines[:line])) + column
+    assert lexer.text == text[:offset(*start)] + replacement + text[offset(*end):]
+
+
+def test_incremental_edit_errors():
+    lexer = vl.IncrementalLexer('x = 1\ny = 2\n')
+    tokens = list(lexer.tokens)
+    with pytest.raises(vl.LexerError):
+        lexer.edit((1, 4), (1, 5), '"2')
+    with pytest.raises(ValueError):
+        lexer.edit((1, 0), (0, 0), '')
+    with pytest.raises(ValueError):
+        lexer.edit((0, 0), (0, 6), '')
+    # Edits which fail leave the text and its tokens as they were.
+    assert lexer.text == 'x = 1\ny = 2\n'
+    assert lexer.tokens == tokens
+
 ###############################################################################
 #
 # FILES
@@ -251,3 +369,46 @@ def test_lexemes():
     assert str(vl.Name('foo')) == 'foo'
     assert repr(vl.Name('foo')) == 'Name(foo)'
     assert repr(vl.INDENT) == 'Indent'
+
+
+def test_lexemes_only_export_lexer_names():
+    lexemes = import_module('viper.lexer.lexemes')
+    assert all(hasattr(vl, name) for name in lexemes.__all__)
+    # The names which the module imports for itself stay there.
+    assert not any(hasattr(vl, name) for name in ('count', 'Callable', 'Dict', 'Type'))
+
+
+def test_terminal_ids_are_unique_per_kind():
+    kinds = [vl.Indent, vl.Dedent, vl.NewLine, vl.Period, vl.Comma, vl.OpenParen, vl.Name, vl.Class, vl.Int,
+             vl.Operator, vl.ReservedName]
+    ids = [kind.terminal_id for kind in kinds]
+    assert len(set(ids)) == len(ids)
+    assert 0 not in ids
+    assert vl.Lexeme.terminal_id == 0
+    assert vl.Name('foo').terminal_id == vl.Name.terminal_id
+
+
+def test_lexemes_are_interned():
+    first = vl.lex_line('foo + foo(1, "s") + Foo')
+    second = vl.lex_line('foo + 1 + "s" + Foo')
+    assert first[0] is first[2] is second[0]
+    assert first[1] is second[1]
+    assert first[4] is second[2] and first[6] is second[4]
+    assert first[-1] is second[-1]
+
+
+def test_clearing_interned_lexemes():
+    before = vl.lex_line('foo')[0]
+    vl.clear_interned_lexemes()
+    after = vl.lex_line('foo')[0]
+    assert after is not before
+    assert after == before and hash(after) == hash(before)
+    assert vl.lex_line('foo')[0] is after
+
+
+def test_lexemes_use_slots():
+    lexemes = vl.lex_line('def foo(x: Int) -> Int: ...')
+    assert all(not hasattr(lexeme, '__dict__') for lexeme in lexemes)
+    unpickled = pickle.loads(pickle.dumps(lexemes))
+    assert unpickled == lexemes
+    assert [repr(lexeme) for lexeme in unpickled] == [repr(lexeme) for lexeme in lexemes]
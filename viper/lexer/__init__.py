@@ -1,2 +1,4 @@
 from .lexemes import *
 from .lexer import *
+from .token_buffer import *
+from .incremental import *
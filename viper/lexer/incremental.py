@@ -0,0 +1,136 @@
+from viper.lexer.lexemes import *
+from viper.lexer.lexer import LexedLine, _lex_text_line
+
+from typing import List, Tuple
+
+__all__ = [
+    'IncrementalLexer',
+]
+
+
+# A place in the text, as a line and a column within that line's text (not counting its line ending). Both count from 0,
+# as editors' positions usually do.
+Position = Tuple[int, int]
+
+
+class IncrementalLexer:
+    """
+    Keeps the lexemes of a text up to date as it is edited. Each edit re-lexes only the lines it touches, and then
+    re-derives the indents and dedents before the next line which is not blank, and the dedents at the end of the text
+    if there is no such line, since those are the only other lexemes which depend on the edited lines. `tokens` is
+    always the same as `lex_lines(text)`.
+    """
+    def __init__(self, text: str = ''):
+        self._lines = _split_kept_lines(text)
+        self._lexed: List[LexedLine] = [_lex_text_line(_line_content(line)) for line in self._lines]
+        # How many of the tokens come from each line: its lexemes, and the newline and indents or dedents before them.
+        self._counts: List[int] = []
+        self.tokens: List[Lexeme] = []
+        prev_indents = 0
+        for i, lexed in enumerate(self._lexed):
+            prev_indents, segment = _lay_out_line(i, lexed, prev_indents)
+            self._counts.append(len(segment))
+            self.tokens.extend(segment)
+        self.tokens.extend(_lay_out_end(prev_indents))
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._lines)
+
+    def edit(self, start: Position, end: Position, text: str):
+        """
+        Replaces the text between the two positions with the given text. If the new lines cannot be lexed, the
+        LexerError is raised before anything is changed.
+        """
+        (start_line, start_column), (end_line, end_column) = start, end
+        if not 0 <= start_line <= end_line < len(self._lines):
+            raise ValueError(f"edit: invalid lines: {start_line} to {end_line}")
+        if not 0 <= start_column <= len(_line_content(self._lines[start_line])):
+            raise ValueError(f"edit: invalid start column: {start_column}")
+        if not 0 <= end_column <= len(_line_content(self._lines[end_line])):
+            raise ValueError(f"edit: invalid end column: {end_column}")
+        if start_line == end_line and start_column > end_column:
+            raise ValueError(f"edit: start column {start_column} is after end column {end_column}")
+        text = self._lines[start_line][:start_column] + text + self._lines[end_line][end_column:]
+        if start_column == 0 and start_line > 0 and self._lines[start_line - 1].endswith('\r'):
+            # A carriage return at the end of the line before could join with a line feed at the start of the new
+            # text to make one line ending, so that line is split again as well.
+            start_line -= 1
+            text = self._lines[start_line] + text
+        new_lines = text.splitlines(keepends=True)
+        if end_line == len(self._lines) - 1 and (not new_lines or _ends_line(new_lines[-1])):
+            new_lines.append('')
+        new_lexed = [_lex_text_line(_line_content(line)) for line in new_lines]
+
+        # Lay out the new lines, following on from the indentation of the last line before them which is not blank.
+        prev_indents = 0
+        for lexed in reversed(self._lexed[:start_line]):
+            if lexed is not None:
+                prev_indents = lexed[0]
+                break
+        new_counts = []
+        new_tokens = []
+        for i, lexed in enumerate(new_lexed, start_line):
+            prev_indents, segment = _lay_out_line(i, lexed, prev_indents)
+            new_counts.append(len(segment))
+            new_tokens.extend(segment)
+
+        token_start = sum(self._counts[:start_line])
+        token_end = token_start + sum(self._counts[start_line:end_line + 1])
+        # The next line which is not blank starts with the indents or dedents from the new lines' indentation. If there
+        # is none, the dedents at the end of the text depend on it instead.
+        next_line = end_line + 1
+        while next_line < len(self._lines) and self._lexed[next_line] is None:
+            next_line += 1
+        if next_line < len(self._lines):
+            _, segment = _lay_out_line(next_line, self._lexed[next_line], prev_indents)
+            token_end += self._counts[next_line]
+            new_tokens.extend(segment)
+            next_count = len(segment)
+        else:
+            token_end = len(self.tokens)
+            new_tokens.extend(_lay_out_end(prev_indents))
+
+        self.tokens[token_start:token_end] = new_tokens
+        if next_line < len(self._lines):
+            self._counts[next_line] = next_count
+        self._lines[start_line:end_line + 1] = new_lines
+        self._lexed[start_line:end_line + 1] = new_lexed
+        self._counts[start_line:end_line + 1] = new_counts
+
+
+def _split_kept_lines(text: str) -> List[str]:
+    # The lines keep their line endings, so that they can be joined back into the text. The last line never has one: if
+    # the text ends with a line ending, it is followed by an empty line, so that there is somewhere to edit after it.
+    lines = text.splitlines(keepends=True)
+    if not lines or _ends_line(lines[-1]):
+        lines.append('')
+    return lines
+
+
+def _ends_line(line: str) -> bool:
+    return line.splitlines() != [line]
+
+
+def _line_content(line: str) -> str:
+    return line.splitlines()[0] if line else ''
+
+
+def _lay_out_line(i: int, lexed: LexedLine, prev_indents: int) -> Tuple[int, List[Lexeme]]:
+    # Gives the lexemes which the `i`th line adds to the text, as in `_lay_out_lines`, and the indentation which the
+    # line after it follows on from.
+    if lexed is None:
+        return prev_indents, []
+    curr_indents, lexemes = lexed
+    indent_diff = curr_indents - prev_indents
+    segment = [NEWLINE] if i != 0 else []
+    if indent_diff > 0:
+        segment.extend([INDENT] * indent_diff)
+    elif indent_diff < 0:
+        segment.extend([DEDENT] * -indent_diff)
+    segment.extend(lexemes)
+    return curr_indents, segment
+
+
+def _lay_out_end(prev_indents: int) -> List[Lexeme]:
+    return [NEWLINE] + [DEDENT] * prev_indents + [ENDMARKER]
@@ -1,7 +1,38 @@
+from itertools import count
+from typing import Callable, Dict, Type
+
+__all__ = [
+    'INDENT_SIZE',
+    'Lexeme', 'Indent', 'Dedent', 'EndMarker', 'NewLine', 'Period', 'Equals', 'Comma', 'OpenParen', 'CloseParen',
+    'Colon', 'LeftArrow', 'RightArrow', 'Ellipsis', 'Int', 'Float', 'String', 'Name', 'ReservedName', 'Underscore',
+    'Class', 'ReservedClass', 'Operator',
+    'INDENT', 'DEDENT', 'ENDMARKER', 'NEWLINE', 'PERIOD', 'EQUALS', 'COMMA', 'OPEN_PAREN', 'CLOSE_PAREN', 'COLON',
+    'L_ARROW', 'R_ARROW', 'ELLIPSIS',
+    'interner', 'intern_lexeme', 'clear_interned_lexemes',
+]
+
+
 INDENT_SIZE = 4
 
 
+# The terminal IDs handed out to the kinds of lexemes, in order of definition.
+_TERMINAL_IDS = count(1)
+
+
 class Lexeme:
+    # Lexemes are produced for every token of the input, so they keep their fields in slots rather than in a
+    # `__dict__`. (Every subclass must declare its own `__slots__` for this to hold.)
+    __slots__ = ('text', '_repl_with_text')
+    # A small integer identifying the kind of the lexeme, so that the parser can match lexemes against the grammar by
+    # comparing integers instead of calling `isinstance`. Each direct subclass of Lexeme is given its own ID (and their
+    # subclasses share it). Plain Lexemes, which only match on their text, have the ID 0.
+    terminal_id = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if Lexeme in cls.__bases__:
+            cls.terminal_id = next(_TERMINAL_IDS)
+
     def __init__(self, text: str, repl_with_text=True):
         self.text = text
         self._repl_with_text = repl_with_text
@@ -15,6 +46,13 @@ class Lexeme:
     def __str__(self):
         return self.text
 
+    @property
+    def terminal_text(self) -> str:
+        """
+        The text which a lexeme must have to match this one in a grammar.
+        """
+        return self.text
+
     def __eq__(self, other):
         # This is inverted from the standard style because we want for Lexemes to be compared less restrictively.
         # The [Python reference](https://docs.python.org/3/reference/datamodel.html#object.__eq__) states:
@@ -30,6 +68,9 @@ class Lexeme:
         # (Specifically, see the `derive' method in viper.parser.languages.) To avoid a hacked-together specialty Lexeme
         # class purely for such comparisons, I opted to invert the type-checking in this method. (Note also that
         # subclassing is considered — the classes need not be identical.)
+        if self is other:
+            # Lexemes are interned, so equal lexemes are usually the same object.
+            return True
         if not isinstance(self, type(other)):
             return False
         return self.text == other.text
@@ -42,104 +83,130 @@ class Lexeme:
 
 
 class Indent(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(' ' * INDENT_SIZE, False)
 
 
 class Dedent(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('', False)
 
 
 class EndMarker(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('EOF', False)
 
 
 class NewLine(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('\n', False)
 
 
 class Period(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('.', False)
 
 
 class Equals(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('=', False)
 
 
 class Comma(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(',', False)
 
 
 class OpenParen(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('(', False)
 
 
 class CloseParen(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(')', False)
 
 
 class Colon(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(':', False)
 
 
 class LeftArrow(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('<-', False)
 
 
 class RightArrow(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('->', False)
 
 
 class Ellipsis(Lexeme):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('...', False)
 
 
 class Int(Lexeme):
-    pass
+    __slots__ = ()
 
 
 class Float(Lexeme):
-    pass
+    __slots__ = ()
 
 
 class String(Lexeme):
-    pass
+    __slots__ = ()
 
 
 class Name(Lexeme):
-    pass
+    __slots__ = ()
 
 
 class ReservedName(Lexeme):
-    pass
+    __slots__ = ()
 
 
 class Underscore(Lexeme):
-    pass
+    __slots__ = ()
 
 
 class Class(Lexeme):
-    pass
+    __slots__ = ()
 
 
 class ReservedClass(Lexeme):
-    pass
+    __slots__ = ()
 
 
 class Operator(Lexeme):
-    pass
+    __slots__ = ()
 
 
 INDENT = Indent()
@@ -155,3 +222,48 @@ COLON = Colon()
 L_ARROW = LeftArrow()
 R_ARROW = RightArrow()
 ELLIPSIS = Ellipsis()
+
+
+# The intern tables of the kinds of lexemes, each mapping texts to the lexeme of that kind with that text.
+_INTERNED: Dict[type, Dict[str, Lexeme]] = {}
+
+
+def interner(kind: Type[Lexeme]) -> Callable[[str], Lexeme]:
+    """
+    Makes a function which finds the lexeme of the given kind with a text, making it if there is none yet. Lexemes are
+    never changed once made, so every occurrence of a token can share one lexeme, and the lexer uses these functions
+    to make them.
+    """
+    table = _intern_table(kind)
+
+    def intern(text: str) -> Lexeme:
+        lexeme = table.get(text)
+        if lexeme is None:
+            lexeme = table[text] = kind(text)
+        return lexeme
+
+    return intern
+
+
+def intern_lexeme(kind: Type[Lexeme], text: str) -> Lexeme:
+    table = _intern_table(kind)
+    lexeme = table.get(text)
+    if lexeme is None:
+        lexeme = table[text] = kind(text)
+    return lexeme
+
+
+def _intern_table(kind: Type[Lexeme]) -> Dict[str, Lexeme]:
+    table = _INTERNED.get(kind)
+    if table is None:
+        table = _INTERNED[kind] = {}
+    return table
+
+
+def clear_interned_lexemes():
+    """
+    Empties the intern tables (e.g. between files, so that they do not keep every token ever lexed alive). Lexemes
+    made before and after still compare equal, only not by identity.
+    """
+    for table in _INTERNED.values():
+        table.clear()
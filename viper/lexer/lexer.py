@@ -1,18 +1,19 @@
 from .reserved_tokens import *
 from viper.error import ViperError
 from viper.lexer.lexemes import *
+from viper.lexer.token_buffer import *
 
 import re
 
-from typing import List, Match, Pattern, Union
+from array import array
+from io import StringIO
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
 __all__ = [
-    'LexerError', 'lex_file', 'lex_lines', 'lex_line', 'lex_token',
+    'LexerError', 'lex_file', 'lex_lines', 'lex_buffer', 'lex_stream', 'lex_line', 'lex_token',
 ]
 
 # FIXME: Ambiguity between names with symbol endings and operators with those same symbols.
-# TODO: Investigate using built-in regex magic parser:
-#         http://code.activestate.com/recipes/457664-hidden-scanner-functionality-in-re-module/
 
 
 # Regular expression patterns.
@@ -25,7 +26,7 @@ RE_FLOAT = re.compile(r'(?:-?\.\d+(?:[eE][+-]?\d+)?)'       # (-).42 | (-).42e-8
                       r'|'
                       r'(?:-?\d+\.\d*(?:[eE][+-]?\d+)?)')   # (-)42.7e2 | (-)42.e9 | (-)42. | (-)42.3e-8
 RE_INT = re.compile(r'(?:-?\d+)')                           # (-)42
-RE_STRING = re.compile(r'(?<!\\)\"((?:[^\"]|\\\")*)(?!\\)\"')
+RE_STRING = re.compile(r'\"((?:[^\"]|\\\")*)(?!\\)\"')
 RE_NAME = re.compile(r'(?:_*[a-z][_a-zA-Z0-9]*(?:-[_a-zA-Z0-9]+)*\'*[!@$%^&*?]?)')
 RE_UNDERSCORE = re.compile(r'_+')
 RE_CLASS = re.compile(r'[A-Z][_a-zA-Z0-9]*(?:-[_a-zA-Z0-9]+)*')
@@ -35,36 +36,65 @@ RE_OPERATOR = re.compile(r'[!@$%^&*()\-=+|:/?<>\[\]{}~.]+')
 RE_WHITESPACE = re.compile(r'\s+')
 
 
-def make_infix_re(pattern: Pattern, group_name: str) -> Pattern:
-    return re.compile(r'(?P<left_val>.*)(?P<' + group_name + '>' + pattern.pattern + r')(?P<right_val>.*)')
+# Every token pattern in one alternation, so that a line can be scanned in a single pass. The alternatives are tried in
+# order, and the name of the group which matched gives the kind of the token. Lexing is linear in the length of the
+# line: each token is matched once, and no pattern looks further ahead than the end of the token it matches (save for
+# an unterminated string, which ends the line with an error).
+RE_TOKEN = re.compile('|'.join(f'(?P<{name}>{pattern.pattern})' for name, pattern in [
+    ('whitespace', RE_WHITESPACE),
+    ('comma', RE_COMMA),
+    ('open_paren', RE_OPEN_PAREN),
+    ('close_paren', RE_CLOSE_PAREN),
+    ('float', RE_FLOAT),
+    ('int', RE_INT),
+    ('string', RE_STRING),
+    ('name', RE_NAME),
+    ('underscore', RE_UNDERSCORE),
+    ('class', RE_CLASS),
+    ('operator', RE_OPERATOR),
+]))
 
+# Operators which have lexemes of their own.
+OPERATOR_LEXEMES = {lexeme.text: lexeme for lexeme in [
+    PERIOD, EQUALS, OPEN_PAREN, CLOSE_PAREN, COLON, L_ARROW, R_ARROW, ELLIPSIS,
+]}
 
-RE_INFIX_COMMA = make_infix_re(RE_COMMA, 'comma')
-RE_INFIX_OP = make_infix_re(RE_OPERATOR, 'op')
 
+_intern_name = interner(Name)
+_intern_reserved_name = interner(ReservedName)
+_intern_class = interner(Class)
+_intern_reserved_class = interner(ReservedClass)
+_intern_operator = interner(Operator)
+_intern_string = interner(String)
 
-# Regular expression magic class for making if/else matching simpler. Idea from:
-#   http://code.activestate.com/recipes/456151-using-rematch-research-and-regroup-in-if-elif-elif/
-class LineRegexMatcher:
-    def __init__(self, line: str):
-        self._line = line
-        self._match = None
 
-    def match(self, pattern: Pattern) -> Match:
-        self._match = pattern.match(self._line)
-        return self._match
+def _make_name(text: str) -> Lexeme:
+    return _intern_reserved_name(text) if text in RESERVED_NAMES else _intern_name(text)
 
-    def end(self) -> int:
-        return self._match.end()
 
-    def group(self, grp: Union[int, str]) -> str:
-        return self._match.group(grp)
+def _make_class(text: str) -> Lexeme:
+    return _intern_reserved_class(text) if text in RESERVED_CLASSES else _intern_class(text)
 
-    def __next__(self):
-        self._line = self._line[self.end():]
 
-    def __bool__(self) -> bool:
-        return bool(self._line)
+def _make_operator(text: str) -> Lexeme:
+    lexeme = OPERATOR_LEXEMES.get(text)
+    return _intern_operator(text) if lexeme is None else lexeme
+
+
+# Makes the (interned) lexeme for the text of each kind of token matched by RE_TOKEN. (Whitespace makes none.)
+TOKEN_LEXEMES: Dict[str, Callable[[str], Lexeme]] = {
+    'comma':        lambda text: COMMA,
+    'open_paren':   lambda text: OPEN_PAREN,
+    'close_paren':  lambda text: CLOSE_PAREN,
+    'float':        interner(Float),
+    'int':          interner(Int),
+    # The text of a string is between its quotes.
+    'string':       lambda text: _intern_string(text[1:-1]),
+    'name':         _make_name,
+    'underscore':   interner(Underscore),
+    'class':        _make_class,
+    'operator':     _make_operator,
+}
 
 
 class LexerError(ViperError):
@@ -73,127 +103,158 @@ class LexerError(ViperError):
 
 def lex_file(file: str) -> List[Lexeme]:
     with open(file) as f:
-        text = f.read()
-    return lex_lines(text)
+        return list(lex_stream(f))
 
 
 def lex_lines(text: str) -> List[Lexeme]:
-    all_lexemes: List[Lexeme] = []
+    return list(lex_stream(StringIO(text)))
+
+
+def lex_stream(fileobj: Iterable[str]) -> Iterator[Lexeme]:
+    """
+    Lexes a file (or any other iterable of lines) one line at a time, yielding the lexemes of each line as soon as it
+    has been read. Only one line is held in memory at once, so files of any size can be lexed.
+    """
+    return _lay_out_lines(_lex_text_line(line) for line in _split_lines(fileobj))
+
+
+def lex_buffer(text: str) -> TokenBuffer:
+    """
+    Lexes text into a TokenBuffer, which holds the lexemes `lex_lines` would give along with where each one lies in
+    the text. Newlines are placed at the end of the token before them, and indents and dedents at the start of the
+    token after them (or at the end of the text, if there is none).
+    """
+    tokens = TokenBuffer()
+    previous_end = None
+    prev_indents = 0
+    for i, (line, spans) in enumerate(_lex_spanned_lines(text, tokens.line_starts)):
+        if line is None:
+            continue
+        curr_indents, lexemes = line
+        for lexeme in _line_prefix(i, prev_indents, curr_indents):
+            offset = previous_end if lexeme is NEWLINE and previous_end is not None else spans[0][0]
+            tokens.append(lexeme, offset, offset)
+        prev_indents = curr_indents
+        for lexeme, (offset, end) in zip(lexemes, spans):
+            tokens.append(lexeme, offset, end)
+        previous_end = spans[-1][1]
+    for lexeme in _end_lexemes(prev_indents):
+        offset = previous_end if lexeme is NEWLINE and previous_end is not None else len(text)
+        tokens.append(lexeme, offset, offset)
+    return tokens
+
+
+# A lexed line is given as its level of indentation and its lexemes, or as None for a line which is blank or only holds
+# a comment.
+LexedLine = Optional[Tuple[int, List[Lexeme]]]
+
+
+def _lay_out_lines(lines: Iterable[LexedLine]) -> Iterator[Lexeme]:
+    """
+    Joins the lexemes of each line, adding the newlines, indents, and dedents between them.
+    """
     prev_indents = 0
-    lines = text.splitlines()
     for i, line in enumerate(lines):
-        # Find the raw number of indentation levels for this line.
-        indent_match = RE_LEADING_INDENT.match(line)
-        if indent_match is None:  # pragma: no cover
-            raise LexerError(f"invalid line indentation given: '{line}'")
-        indentation, rest = indent_match.groups()
-        rest = rest.strip()
-        if not rest:
+        if line is None:
             # Don't use blank lines to handle indentation.
             continue
-        if rest.startswith('#'):
-            # Skip comments.
-            continue
-        lexemes = lex_line(rest)
-        curr_indents = len(indentation) // INDENT_SIZE
-        # Determine whether we need to add indents, dedents, or neither.
-        indent_diff = curr_indents - prev_indents
+        curr_indents, lexemes = line
+        yield from _line_prefix(i, prev_indents, curr_indents)
         prev_indents = curr_indents
-        if indent_diff > 0:
-            # This line is more indented than the previous line.
-            for _ in range(indent_diff):
-                lexemes.insert(0, INDENT)
-            # Add a newline before all the indents.
-            lexemes.insert(0, NEWLINE)
-        elif indent_diff < 0:
-            # This line is less indented than the previous line, which means DEDENT tokens are needed.
-            for _ in range(abs(indent_diff)):
-                lexemes.insert(0, DEDENT)
-            # Add a newline before the dedents.
-            lexemes.insert(0, NEWLINE)
-        else:
-            # We're at the same indentation level, so add neither.
-            lexemes.insert(0, NEWLINE)
-        # If this is the first line, remove the extraneous NEWLINE.
-        if i == 0:
-            del(lexemes[0])
-        # Add these lexemes to the list.
-        all_lexemes += lexemes
+        yield from lexemes
+    yield from _end_lexemes(prev_indents)
+
+
+def _line_prefix(i: int, prev_indents: int, curr_indents: int) -> List[Lexeme]:
+    """
+    Gives the lexemes which come before those of the `i`th line of a file, where the last line which was not blank
+    had `prev_indents` levels of indentation.
+    """
+    # Every line is preceded by a newline (except the first line of the file), and then by the indents or dedents
+    # which take it to its level of indentation.
+    prefix = [NEWLINE] if i != 0 else []
+    indent_diff = curr_indents - prev_indents
+    if indent_diff > 0:
+        # This line is more indented than the previous line.
+        prefix.extend([INDENT] * indent_diff)
+    elif indent_diff < 0:
+        # This line is less indented than the previous line, which means DEDENT tokens are needed.
+        prefix.extend([DEDENT] * -indent_diff)
+    return prefix
+
+
+def _end_lexemes(prev_indents: int) -> List[Lexeme]:
     # At the end of the file, append necessary dedents, newline, and end-of-file tokens.
-    all_lexemes.append(NEWLINE)
-    for _ in range(prev_indents):
-        all_lexemes.append(DEDENT)
-    all_lexemes.append(ENDMARKER)
-    return all_lexemes
+    return [NEWLINE] + [DEDENT] * prev_indents + [ENDMARKER]
+
+
+def _split_lines(fileobj: Iterable[str]) -> Iterator[str]:
+    # Lines read from a file keep their line endings, and can contain other characters which `str.splitlines` breaks
+    # lines at, so each is split again to give the same lines as splitting the whole text would.
+    for chunk in fileobj:
+        yield from chunk.splitlines()
+
+
+def _lex_text_line(line: str, spans: Optional[List[Tuple[int, int]]] = None, offset: int = 0) -> LexedLine:
+    """
+    Lexes one line of a file. If `spans` is given, the start and end of each lexeme are added to it, as offsets from
+    the start of the line plus `offset`.
+    """
+    # Find the raw number of indentation levels for this line.
+    indent_match = RE_LEADING_INDENT.match(line)
+    if indent_match is None:  # pragma: no cover
+        raise LexerError(f"invalid line indentation given: '{line}'")
+    indentation, rest = indent_match.groups()
+    stripped = rest.strip()
+    if not stripped or stripped.startswith('#'):
+        # Skip blank lines and comments.
+        return None
+    if spans is None:
+        return len(indentation) // INDENT_SIZE, lex_line(stripped)
+    line_spans = []
+    lexemes = lex_line(stripped, line_spans)
+    start = offset + len(indentation) + len(rest) - len(rest.lstrip())
+    spans.extend((start + token_start, start + token_end) for token_start, token_end in line_spans)
+    return len(indentation) // INDENT_SIZE, lexemes
+
+
+def _lex_spanned_lines(text: str, line_starts: array) -> Iterator[Tuple[LexedLine, List[Tuple[int, int]]]]:
+    """
+    Lexes each line of the text as `_lex_text_line` does, giving the lexed line along with the start and end offsets
+    of its lexemes in the text. The offset of each line is added to `line_starts` as it goes.
+    """
+    offset = 0
+    line = chunk = ''
+    for chunk in text.splitlines(True):
+        line_starts.append(offset)
+        line = chunk.splitlines()[0]
+        spans = []
+        yield _lex_text_line(line, spans, offset), spans
+        offset += len(chunk)
+    if chunk != line or not line_starts:
+        # The text ends with a line break (or is empty), so its end starts a line of its own.
+        line_starts.append(offset)
 
 
-def lex_line(line: str) -> List[Lexeme]:
+def lex_line(line: str, spans: Optional[List[Tuple[int, int]]] = None) -> List[Lexeme]:
+    """
+    Lexes a line without any indentation. If `spans` is given, the start and end offsets of each lexeme are added to
+    it.
+    """
     lexemes = []
-    if not line:
-        return lexemes
-    matcher = LineRegexMatcher(line)
-    while matcher:
-        if matcher.match(RE_WHITESPACE):
-            pass
-        elif matcher.match(RE_COMMA):
-            lexemes.append(COMMA)
-        elif matcher.match(RE_OPEN_PAREN):
-            lexemes.append(OPEN_PAREN)
-        elif matcher.match(RE_CLOSE_PAREN):
-            lexemes.append(CLOSE_PAREN)
-        elif matcher.match(RE_FLOAT):
-            lexemes.append(Float(matcher.group(0)))
-        elif matcher.match(RE_INT):
-            lexemes.append(Int(matcher.group(0)))
-        elif matcher.match(RE_STRING):
-            lexemes.append(String(matcher.group(1)))
-        elif matcher.match(RE_NAME):
-            text = matcher.group(0)
-            if text in RESERVED_NAMES:
-                lexemes.append(ReservedName(text))
-            else:
-                lexemes.append(Name(text))
-        elif matcher.match(RE_UNDERSCORE):
-            text = matcher.group(0)
-            lexemes.append(Underscore(text))
-        elif matcher.match(RE_CLASS):
-            text = matcher.group(0)
-            if text in RESERVED_CLASSES:
-                lexemes.append(ReservedClass(text))
-            else:
-                lexemes.append(Class(text))
-        elif matcher.match(RE_OPERATOR):
-            symbol = matcher.group(0)
-            if symbol == PERIOD.text:
-                lexemes.append(PERIOD)
-            elif symbol == EQUALS.text:
-                lexemes.append(EQUALS)
-            elif symbol == OPEN_PAREN.text:
-                lexemes.append(OPEN_PAREN)
-            elif symbol == CLOSE_PAREN.text:
-                lexemes.append(CLOSE_PAREN)
-            elif symbol == COLON.text:
-                lexemes.append(COLON)
-            elif symbol == L_ARROW.text:
-                lexemes.append(L_ARROW)
-            elif symbol == R_ARROW.text:
-                lexemes.append(R_ARROW)
-            elif symbol == ELLIPSIS.text:
-                lexemes.append(ELLIPSIS)
-            else:
-                lexemes.append(Operator(symbol))
-        elif matcher.match(RE_INFIX_COMMA):
-            lexemes.extend(lex_line(matcher.group('left_val')))
-            lexemes.append(COMMA)
-            lexemes.extend(lex_line(matcher.group('right_val')))
-        elif matcher.match(RE_INFIX_OP):
-            lexemes.extend(lex_line(matcher.group('left_val')))
-            lexemes.extend(lex_line(matcher.group('op')))
-            lexemes.extend(lex_line(matcher.group('right_val')))
-        else:
+    pos = 0
+    end = len(line)
+    match_token = RE_TOKEN.match
+    while pos < end:
+        match = match_token(line, pos)
+        if match is None:
             raise LexerError(f"invalid line: '{line}'")
-        # Iterate the matcher forward.
-        next(matcher)
+        pos = match.end()
+        make_lexeme = TOKEN_LEXEMES.get(match.lastgroup)
+        if make_lexeme is not None:
+            lexemes.append(make_lexeme(match.group()))
+            if spans is not None:
+                spans.append(match.span())
     return lexemes
 
 
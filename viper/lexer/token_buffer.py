@@ -0,0 +1,82 @@
+from viper.lexer.lexemes import *
+
+from array import array
+from bisect import bisect_right
+from typing import Dict, Iterator, List, NamedTuple, Type
+
+__all__ = [
+    'Span', 'TokenBuffer',
+]
+
+
+# Where a token lies in its source. Lines count from 1 and columns from 0, as in Python's own tracebacks, and `end` is
+# the offset just past the token. Tokens which stand for no text (such as indents) have spans of length 0.
+Span = NamedTuple('Span', [('line', int), ('column', int), ('offset', int), ('end', int)])
+
+
+# The lexemes of which there is only ever one, by kind.
+_SINGLETONS: Dict[type, Lexeme] = {type(lexeme): lexeme for lexeme in [
+    INDENT, DEDENT, ENDMARKER, NEWLINE, PERIOD, EQUALS, COMMA, OPEN_PAREN, CLOSE_PAREN, COLON, L_ARROW, R_ARROW, ELLIPSIS,
+]}
+
+
+class TokenBuffer:
+    """
+    A sequence of tokens kept in parallel arrays instead of as Lexeme objects. For each token, it stores the ID of its
+    kind, the index of its text in a table of distinct texts, and the offsets at which it starts and ends in its
+    source; lines and columns are found from the offsets at which the source's lines start. Indexing the buffer gives a
+    Lexeme made on demand (and interned, so repeated tokens still share one).
+    """
+    def __init__(self):
+        self.kinds = array('H')
+        self.texts = array('I')
+        self.offsets = array('I')
+        self.ends = array('I')
+        self.line_starts = array('I')
+        self._kind_types: List[Type[Lexeme]] = []
+        self._kind_ids: Dict[Type[Lexeme], int] = {}
+        self._text_strings: List[str] = []
+        self._text_ids: Dict[str, int] = {}
+
+    def append(self, lexeme: Lexeme, offset: int, end: int):
+        kind = type(lexeme)
+        kind_id = self._kind_ids.get(kind)
+        if kind_id is None:
+            kind_id = self._kind_ids[kind] = len(self._kind_types)
+            self._kind_types.append(kind)
+        text_id = self._text_ids.get(lexeme.text)
+        if text_id is None:
+            text_id = self._text_ids[lexeme.text] = len(self._text_strings)
+            self._text_strings.append(lexeme.text)
+        self.kinds.append(kind_id)
+        self.texts.append(text_id)
+        self.offsets.append(offset)
+        self.ends.append(end)
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index: int) -> Lexeme:
+        kind = self.kind(index)
+        singleton = _SINGLETONS.get(kind)
+        if singleton is not None:
+            return singleton
+        return intern_lexeme(kind, self.text(index))
+
+    def __iter__(self) -> Iterator[Lexeme]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def kind(self, index: int) -> Type[Lexeme]:
+        return self._kind_types[self.kinds[index]]
+
+    def text(self, index: int) -> str:
+        return self._text_strings[self.texts[index]]
+
+    def span(self, index: int) -> Span:
+        offset = self.offsets[index]
+        line = bisect_right(self.line_starts, offset)
+        return Span(line, offset - self.line_starts[line - 1], offset, self.ends[index])
+
+    def lexemes(self) -> List[Lexeme]:
+        return list(self)
@@ -1,2 +1,3 @@
 from .ast import AST, ast_to_string
 from .grammar import GRAMMAR, Parse, NoParse, SingleParse, MultipleParse
+from .languages import parser_stats
@@ -1,11 +1,19 @@
 from .ast import AST
-from .languages import ParseTreeChar, make_sppf, SPPF
+from .ast.nodes import FileInput
+from .grammar_cache import load_grammar_rules
+from .languages import DerivativeCache, ParserState, ParseTreeChar, Token, make_sppf, SPPF
 from .linguify_grammar import linguify_grammar_file
 
 from viper.formal_grammar import GRAMMAR_FILE
-from viper.lexer import Lexeme
+from viper.lexer import Dedent, EndMarker, Indent, Lexeme, NewLine, ReservedName
 
-from typing import List
+import os
+
+from typing import Dict, Iterator, List, Optional
+
+
+# The default bound on the number of rule derivatives each grammar remembers.
+DEFAULT_CACHE_SIZE = 4096
 
 
 class Parse:
@@ -14,7 +22,18 @@ class Parse:
 
 
 class NoParse(Parse):
-    pass
+    """
+    A failed parse. Where known, `position` is the index of the first lexeme which could not be parsed (or the number
+    of lexemes, if the input ended too soon) and `expected` holds the terminals which would have been accepted there.
+    """
+    def __init__(self, position: Optional[int] = None, expected: Optional[List[Token]] = None):
+        self.position = position
+        self.expected = [] if expected is None else expected
+
+    def __repr__(self):
+        if self.position is None:
+            return super().__repr__()
+        return super().__repr__() + f': at lexeme {self.position}, expected one of: {self.expected}'
 
 
 class SingleParse(Parse):
@@ -31,24 +50,53 @@ class MultipleParse(Parse):
 
 
 class Grammar:
-    def __init__(self, grammar_filename: str):
+    def __init__(self, grammar_filename: str, cache_size: Optional[int] = DEFAULT_CACHE_SIZE, use_cache: bool = False):
+        """
+        Compiles the grammar file into its rules. With `use_cache`, the compiled rules are saved to (and, when the file
+        has not changed, loaded from) the on-disk grammar cache.
+        """
         self.file = grammar_filename
-        self.rules = linguify_grammar_file(self.file)
+        self.cache_size = cache_size
+        if use_cache:
+            self.rules = load_grammar_rules(self.file, cache_size)
+        else:
+            self.rules = linguify_grammar_file(self.file, cache_size)
 
-    def sppf_from_rule(self, rule: str, lexemes: List[Lexeme]) -> SPPF:
-        lang = self.rules[rule]
-        return make_sppf(lang, lexemes)
+    def rebuild_cache(self):
+        """
+        Recompiles the grammar file, replacing both these rules and the cached copy of them.
+        """
+        self.rules = load_grammar_rules(self.file, self.cache_size, rebuild=True)
 
-    def parse_rule(self, rule: str, lexemes: List[Lexeme]) -> Parse:
-        sppf = self.sppf_from_rule(rule, lexemes)
-        parses = []
-        for child in sppf:
-            if not isinstance(child, ParseTreeChar):
-                raise RuntimeError(f"Invalid parse result: {child}")
-            result = child.token
-            if not isinstance(result, AST):
-                raise RuntimeError(f"Invalid parse result: {result}")
-            parses.append(result)
+    @property
+    def derivatives(self) -> DerivativeCache:
+        return self.rules.derivatives
+
+    def sppf_from_rule(self, rule: str, lexemes: List[Lexeme], compaction: bool = True) -> SPPF:
+        lang = self.rules[rule]
+        return make_sppf(lang, lexemes, compaction)
+
+    def parser_state(self, rule: str = 'file_input', compaction: bool = True) -> ParserState:
+        """
+        Starts an incremental parse of the rule, to which lexemes can be fed as they are produced.
+        """
+        return ParserState(self.rules[rule], compaction)
+
+    def parse_rule(self, rule: str, lexemes: List[Lexeme], compaction: bool = True) -> Parse:
+        state = self.parser_state(rule, compaction)
+        state.feed_all(lexemes)
+        if state.failure is not None:
+            return NoParse(state.failure.position, state.failure.expected)
+        if not state.is_accepting():
+            return NoParse(state.position, state.expected())
+        return self.parse_from_sppf(state.results())
+
+    @staticmethod
+    def parse_from_sppf(sppf: SPPF) -> Parse:
+        """
+        Converts the SPPF of a rule's parses into a Parse of the ASTs it holds.
+        """
+        parses = list(Grammar.iter_parses(sppf))
         if len(parses) == 0:
             return NoParse()
         elif len(parses) == 1:
@@ -56,8 +104,106 @@ class Grammar:
         else:
             return MultipleParse(parses)
 
-    def parse_file(self, lexemes: List[Lexeme]) -> Parse:
-        return self.parse_rule('file_input', lexemes)
-
-
-GRAMMAR = Grammar(GRAMMAR_FILE)
+    @staticmethod
+    def iter_parses(sppf: SPPF) -> Iterator[AST]:
+        """
+        Produces the ASTs held by the SPPF of a rule's parses one at a time.
+        """
+        for child in sppf:
+            if not isinstance(child, ParseTreeChar):
+                raise RuntimeError(f"Invalid parse result: {child}")
+            result = child.token
+            if not isinstance(result, AST):
+                raise RuntimeError(f"Invalid parse result: {result}")
+            yield result
+
+    def parse_file(self, lexemes: List[Lexeme], compaction: bool = True, parallel: bool = False,
+                   max_workers: Optional[int] = None) -> Parse:
+        """
+        Parses a whole file. With `parallel`, each top-level line of the file is parsed separately in a pool of
+        `max_workers` processes, and the lines are put back together into the file's AST. The result is the same as
+        that of a serial parse: if some line does not have exactly one parse, the file is parsed again serially.
+        """
+        if parallel:
+            lines = self._parse_file_lines(lexemes, compaction, max_workers)
+            if lines is not None:
+                return SingleParse(FileInput(lines))
+        return self.parse_rule('file_input', lexemes, compaction)
+
+    def _parse_file_lines(self, lexemes: List[Lexeme], compaction: bool,
+                          max_workers: Optional[int]) -> Optional[List[AST]]:
+        chunks = split_file_lines(lexemes)
+        if chunks is None:
+            return None
+        if not chunks:
+            return []
+        # Starting processes costs far more than this import, which serial parsing need not pay for.
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = max_workers or os.cpu_count() or 1
+        # Hand the lines out in batches, so that short lines are not swamped by the cost of sending them.
+        chunk_size = max(1, len(chunks) // (4 * workers))
+        args = [(self.file, self.cache_size, compaction, chunk) for chunk in chunks]
+        with ProcessPoolExecutor(workers) as executor:
+            lines = list(executor.map(_parse_file_line, args, chunksize=chunk_size))
+        if any(line is None for line in lines):
+            return None
+        return lines
+
+
+# Top-level lines which begin with these continue the compound statement before them, rather than starting another.
+_CONTINUATION_KEYWORDS = {'elif', 'else'}
+
+
+def split_file_lines(lexemes: List[Lexeme]) -> Optional[List[List[Lexeme]]]:
+    """
+    Splits the lexemes of a file into its top-level lines, each of which ends where the indentation returns to zero
+    after a NEWLINE or DEDENT. The ENDMARKER is dropped. Returns None if the lexemes do not end with an ENDMARKER.
+    """
+    if not lexemes or not isinstance(lexemes[-1], EndMarker):
+        return None
+    chunks = []
+    depth = 0
+    start = 0
+    end = len(lexemes) - 1
+    for i in range(end):
+        lexeme = lexemes[i]
+        if isinstance(lexeme, Indent):
+            depth += 1
+        elif isinstance(lexeme, Dedent):
+            depth -= 1
+        elif not isinstance(lexeme, NewLine):
+            continue
+        if depth == 0:
+            following = lexemes[i + 1]
+            if isinstance(following, Indent):
+                continue
+            if isinstance(following, ReservedName) and following.text in _CONTINUATION_KEYWORDS:
+                continue
+            chunks.append(lexemes[start:i + 1])
+            start = i + 1
+    if start < end:
+        chunks.append(lexemes[start:end])
+    return chunks
+
+
+# The grammars used by `_parse_file_line` in each worker process, by file name.
+_WORKER_GRAMMARS: Dict[str, 'Grammar'] = {}
+
+
+def _parse_file_line(args) -> Optional[AST]:
+    """
+    Parses one top-level line of a file in a worker process, returning its AST or None if it has no single parse.
+    """
+    grammar_file, cache_size, compaction, lexemes = args
+    grammar = _WORKER_GRAMMARS.get(grammar_file)
+    if grammar is None:
+        grammar = GRAMMAR if grammar_file == GRAMMAR.file else Grammar(grammar_file, cache_size, use_cache=True)
+        _WORKER_GRAMMARS[grammar_file] = grammar
+    parse = grammar.parse_rule('file_line', lexemes, compaction)
+    if isinstance(parse, SingleParse):
+        return parse.ast
+    return None
+
+
+GRAMMAR = Grammar(GRAMMAR_FILE, use_cache=True)
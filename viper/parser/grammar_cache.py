@@ -0,0 +1,93 @@
+from .languages import RuleDict
+from .linguify_grammar import linguify_grammar_file
+
+import os
+import pickle
+import sys
+
+from os.path import basename, dirname, join
+from typing import Optional
+
+
+# The parser's own sources, whose classes make up a compiled grammar. A change to any of them invalidates the cache.
+_PARSER_DIRS = [dirname(__file__), join(dirname(dirname(__file__)), 'lexer')]
+
+
+def grammar_cache_path(grammar_filename: str) -> str:
+    """
+    Finds where the compiled form of a grammar file is cached. Like Python's bytecode, it is kept in a `__pycache__`
+    directory beside the source.
+    """
+    return join(dirname(grammar_filename), '__pycache__', basename(grammar_filename) + '.pickle')
+
+
+def grammar_cache_key(grammar_filename: str) -> str:
+    """
+    Hashes everything a compiled grammar depends on: the grammar file itself, the source of the parser which compiled
+    it, and the version of Python (and so of pickle) which stored it.
+    """
+    import hashlib
+
+    digest = hashlib.sha256()
+    digest.update(f'{sys.version_info[:2]}:{pickle.HIGHEST_PROTOCOL}'.encode())
+    with open(grammar_filename, 'rb') as f:
+        digest.update(f.read())
+    for parser_dir in _PARSER_DIRS:
+        for root, dirs, files in os.walk(parser_dir):
+            dirs[:] = sorted(d for d in dirs if d != '__pycache__')
+            for file in sorted(files):
+                if file.endswith('.py'):
+                    digest.update(file.encode())
+                    with open(join(root, file), 'rb') as f:
+                        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_grammar_rules(grammar_filename: str, cache_size: Optional[int] = None, rebuild: bool = False) -> RuleDict:
+    """
+    Produces the rules of a grammar file, reading them from the cache if it holds an up-to-date copy and otherwise
+    linguifying the file and caching the result. With `rebuild`, the cache is ignored and overwritten.
+    """
+    key = grammar_cache_key(grammar_filename)
+    cache_path = grammar_cache_path(grammar_filename)
+    rules = None if rebuild else _read_cache(cache_path, key)
+    if rules is None:
+        rules = linguify_grammar_file(grammar_filename, cache_size)
+        _write_cache(cache_path, key, rules)
+    else:
+        rules.derivatives.max_size = cache_size
+    return rules
+
+
+def _read_cache(cache_path: str, key: str) -> Optional[RuleDict]:
+    try:
+        with open(cache_path, 'rb') as f:
+            if f.readline().rstrip(b'\n') != key.encode():
+                return None
+            rules = pickle.load(f)
+    except Exception:
+        # A missing, stale, or corrupt cache is simply rebuilt.
+        return None
+    return rules if isinstance(rules, RuleDict) else None
+
+
+def _write_cache(cache_path: str, key: str, rules: RuleDict):
+    # The cache is written to a temporary file and moved into place, so concurrent readers never see half of it. Failing
+    # to write it (e.g. in a read-only installation) only costs the next start its speed. Writing is rare, so tempfile
+    # is only imported when it is needed.
+    import tempfile
+
+    try:
+        os.makedirs(dirname(cache_path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=dirname(cache_path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(key.encode() + b'\n')
+                pickle.dump(rules, f, pickle.HIGHEST_PROTOCOL)
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, cache_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+    except OSError:
+        pass
@@ -5,6 +5,13 @@ class GrammarToken:
     def __init__(self, lexeme_class: ClassVar, text=None):
         self._lexeme_class = lexeme_class
         self._text = text
+        # Grammar tokens match every lexeme of their class, whatever its text.
+        self.terminal_id = lexeme_class.terminal_id
+        self.terminal_text = None
+
+    @property
+    def text(self):
+        return self._text
 
     def __eq__(self, other):
         if isinstance(other, GrammarToken):
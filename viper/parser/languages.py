@@ -1,18 +1,84 @@
 from abc import ABC, abstractmethod
-from collections import defaultdict
-from typing import Any, Callable, List
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+from weakref import WeakValueDictionary
 
 
 Token = Any
 Parse = List[Token]
 PartialParse = List[Parse]
 
+# Integer tags identifying the kind of each Language and ParseTree node. The core functions dispatch on these through
+# handler tables, which is considerably faster than chains of `isinstance` checks against the ABCs.
+EMPTY_KIND = 0
+EPSILON_KIND = 1
+LITERAL_KIND = 2
+RULE_KIND = 3
+DELAY_KIND = 4
+CONCAT_KIND = 5
+ALT_KIND = 6
+REP_KIND = 7
+RED_KIND = 8
+TOKEN_EPSILON_KIND = 9
+BIND_KIND = 10
+
+TREE_EMPTY_KIND = 0
+TREE_EPS_KIND = 1
+TREE_CHAR_KIND = 2
+TREE_PAIR_KIND = 3
+TREE_REP_KIND = 4
+
+
+def _render(item, start_column: int, expand: Callable[[Any, int], list]) -> str:
+    """
+    Builds the string for a nested structure without recursing. `expand(item, column)` gives the pieces of an item's
+    string, each of which is either a string or an (item, column) pair to be rendered in its place.
+    """
+    pieces = []
+    stack = [(item, start_column)]
+    while stack:
+        piece = stack.pop()
+        if type(piece) is str:
+            pieces.append(piece)
+        else:
+            stack.extend(reversed(expand(*piece)))
+    return "".join(pieces)
+
 
 class SPPF:
+    """
+    A shared packed parse forest: the alternative parse trees for some span of the input. Forests are shared between
+    all of the trees containing them rather than copied, and `+` packs two forests together in constant time. The
+    alternatives of a packed forest are gathered into one list only when they are first looked at (its length is known
+    without doing so), so forests should not be modified once they have been packed into another.
+    """
+    __slots__ = ('_trees', '_packed', '_length')
+
     def __init__(self, *args):
-        self._sppf: List[ParseTree] = []
-        for arg in args:
-            self._sppf.append(arg)
+        self._trees: List[ParseTree] = list(args)
+        # The forests packed into this one whose trees have not yet been gathered into `_trees`, and how many trees
+        # they hold between them.
+        self._packed: Optional[List[SPPF]] = None
+        self._length = 0
+
+    @property
+    def _sppf(self) -> List['ParseTree']:
+        if self._packed is not None:
+            self._unpack()
+        return self._trees
+
+    def _unpack(self):
+        trees = self._trees
+        stack = list(reversed(self._packed))
+        while stack:
+            forest = stack.pop()
+            if forest._packed is None:
+                trees.extend(forest._trees)
+            else:
+                # Packed forests have no trees of their own until they are unpacked.
+                stack.extend(reversed(forest._packed))
+        self._packed = None
 
     def __eq__(self, other):
         if not isinstance(other, SPPF):
@@ -20,7 +86,9 @@ class SPPF:
         return self._sppf == other._sppf
 
     def __len__(self):
-        return len(self._sppf)
+        if self._packed is not None:
+            return self._length
+        return len(self._trees)
 
     def __bool__(self):
         return len(self) > 0
@@ -39,12 +107,9 @@ class SPPF:
     def __add__(self, other):
         if not isinstance(other, SPPF):
             raise NotImplementedError
-        from itertools import chain
         result = SPPF()
-        new_list = []
-        for item in chain(self._sppf, other._sppf):
-            new_list.append(item)
-        result._sppf = new_list
+        result._packed = [self, other]
+        result._length = len(self) + len(other)
         return result
 
     def __str__(self):
@@ -54,18 +119,7 @@ class SPPF:
         return str(self)
 
     def make_nice_string(self, start_column: int) -> str:
-        if len(self) == 0:
-            return "(empty)"
-        elif len(self) == 1:
-            return self[0].make_nice_string(start_column)
-        else:
-            leader = "(choice "
-            indent = start_column + len(leader)
-            lines = [leader + self[0].make_nice_string(indent)]
-            for tree in self[1:]:
-                line = (" " * indent) + tree.make_nice_string(indent)
-                lines.append(line)
-            return "\n".join(lines) + ")"
+        return _render(self, start_column, _make_nice_tree_pieces)
 
 
 EpsFunc = Callable[[], SPPF]
@@ -106,6 +160,39 @@ class RightEpsRedFunc(RedFunc):
         return SPPF(ParseTreePair(left, self.right))
 
 
+class ComposedRedFunc(RedFunc):
+    def __init__(self, *funcs: RedFunc):
+        # The functions are applied in order, so the innermost reduction comes first.
+        self.funcs = []
+        for func in funcs:
+            if isinstance(func, ComposedRedFunc):
+                self.funcs.extend(func.funcs)
+            else:
+                self.funcs.append(func)
+
+    def make_nice_string(self, start_column: int) -> str:
+        return " . ".join(func.make_nice_string(start_column) for func in reversed(self.funcs))
+
+    def __call__(self, sppf: SPPF) -> SPPF:
+        for func in self.funcs:
+            sppf = func(sppf)
+        return sppf
+
+
+class ReducedEpsFunc:
+    """
+    Produces the parse of an epsilon which compaction has made from a reduction of another epsilon.
+    """
+    def __init__(self, inner: 'Epsilon', func: RedFunc):
+        self.inner = inner
+        self.func = func
+
+    def __call__(self) -> SPPF:
+        if _STATS is not None:
+            _STATS.red_func_calls += 1
+        return self.func(parse_null(self.inner))
+
+
 class RepRedFunc(RedFunc):
     def make_nice_string(self, start_column: int) -> str:
         return self.repr_string
@@ -118,20 +205,20 @@ class RepRedFunc(RedFunc):
             return SPPF()
         elif len(sppf) == 1:
             child = sppf[0]
-            if isinstance(child, ParseTreeEps):
+            if child.kind == TREE_EPS_KIND:
                 return SPPF(ParseTreeChar([]))
-            elif isinstance(child, ParseTreeChar):
+            elif child.kind == TREE_CHAR_KIND:
                 return SPPF(ParseTreeChar([child.token]))
-            elif isinstance(child, ParseTreePair):
+            elif child.kind == TREE_PAIR_KIND:
                 accum = []
                 curr = child
-                while isinstance(curr, ParseTreePair):
+                while curr.kind == TREE_PAIR_KIND:
                     inner_child_sppf: SPPF = curr.left
                     if len(inner_child_sppf) == 0:
                         return SPPF()
                     elif len(inner_child_sppf) == 1:
                         inner_child = inner_child_sppf[0]
-                        if not isinstance(inner_child, ParseTreeChar):
+                        if inner_child.kind != TREE_CHAR_KIND:
                             raise RuntimeError(f"Invalid inner child of list-rep reduction: {curr.left}")
                         accum.append(inner_child.token)
                         inner_sppf: SPPF = curr.right
@@ -143,9 +230,9 @@ class RepRedFunc(RedFunc):
                             raise RuntimeError("Too many children in inner-inner list-rep reduction target.")
                     else:
                         raise RuntimeError("Too many children in inner list-rep reduction target.")
-                if isinstance(curr, ParseTreeEmpty):
+                if curr.kind == TREE_EMPTY_KIND:
                     return SPPF()
-                elif isinstance(curr, ParseTreeEps):
+                elif curr.kind == TREE_EPS_KIND:
                     return SPPF(ParseTreeChar(accum))
                 else:
                     raise RuntimeError("Invalid inner list-rep reduction target.")
@@ -174,14 +261,14 @@ class MinRepRedFunc(RedFunc):
             return SPPF()
         elif len(sppf) == 1:
             child = sppf[0]
-            if not isinstance(child, ParseTreePair):
+            if child.kind != TREE_PAIR_KIND:
                 raise RuntimeError("Invalid min-rep child.")
             left_sppf = child.left
             if len(left_sppf) == 0:
                 return SPPF()
             elif len(left_sppf) == 1:
                 left_child = left_sppf[0]
-                if not isinstance(left_child, ParseTreeChar):
+                if left_child.kind != TREE_CHAR_KIND:
                     raise RuntimeError("Invalid left child of min-rep reduction.")
                 left = left_child.token
             else:
@@ -193,7 +280,7 @@ class MinRepRedFunc(RedFunc):
                 return SPPF(ParseTreeChar([left]))
             elif len(right_sppf) == 1:
                 right_child = right_sppf[0]
-                if not isinstance(right_child, ParseTreeChar):
+                if right_child.kind != TREE_CHAR_KIND:
                     raise RuntimeError("Invalid right child of min-rep reduction.")
                 right = right_child.token
             else:
@@ -211,7 +298,7 @@ class SepRepEpsRedFunc(RedFunc):
         if len(sppf) == 0:
             return SPPF()
         elif len(sppf) == 1:
-            return SPPF(ParseTreeEps())
+            return _EPS_SPPF
         else:
             raise RuntimeError("Epsilon produced multiple results.")
 
@@ -225,7 +312,7 @@ class SepRepConcatRedFunc(RedFunc):
             return SPPF()
         elif len(sppf) == 1:
             child = sppf[0]
-            if not isinstance(child, ParseTreePair):
+            if child.kind != TREE_PAIR_KIND:
                 raise RuntimeError("Invalid concat child.")
             return child.right
         else:
@@ -233,6 +320,9 @@ class SepRepConcatRedFunc(RedFunc):
 
 
 class ParseTree(ABC):
+    __slots__ = ()
+    kind: int = None
+
     def __str__(self):
         return self.make_nice_string(0)
 
@@ -249,6 +339,9 @@ class ParseTree(ABC):
 
 
 class ParseTreeEmpty(ParseTree):
+    __slots__ = ()
+    kind = TREE_EMPTY_KIND
+
     def __eq__(self, other):
         return isinstance(other, ParseTreeEmpty)
 
@@ -257,6 +350,9 @@ class ParseTreeEmpty(ParseTree):
 
 
 class ParseTreeEps(ParseTree):
+    __slots__ = ()
+    kind = TREE_EPS_KIND
+
     def __eq__(self, other):
         return isinstance(other, ParseTreeEps)
 
@@ -264,7 +360,15 @@ class ParseTreeEps(ParseTree):
         return "(eps)"
 
 
+# Parse trees and forests are never modified once built, so those which do not depend on the input are shared.
+_EPS_TREE = ParseTreeEps()
+_EPS_SPPF = SPPF(_EPS_TREE)
+
+
 class ParseTreeChar(ParseTree):
+    __slots__ = ('token',)
+    kind = TREE_CHAR_KIND
+
     def __init__(self, token: Token):
         self.token = token
 
@@ -278,6 +382,9 @@ class ParseTreeChar(ParseTree):
 
 
 class ParseTreePair(ParseTree):
+    __slots__ = ('left', 'right')
+    kind = TREE_PAIR_KIND
+
     def __init__(self, left: SPPF, right: SPPF):
         self.left = left
         self.right = right
@@ -288,15 +395,13 @@ class ParseTreePair(ParseTree):
         return self.left == other.left and self.right == other.right
 
     def make_nice_string(self, start_column: int) -> str:
-        leader = "(pair "
-        indent = start_column + len(leader)
-        return (
-            leader + self.left.make_nice_string(indent) + "\n" +
-            (" " * indent) + self.right.make_nice_string(indent) + ")"
-        )
+        return _render(self, start_column, _make_nice_tree_pieces)
 
 
 class ParseTreeRep(ParseTree):
+    __slots__ = ('parse',)
+    kind = TREE_REP_KIND
+
     def __init__(self, partial: SPPF):
         self.parse = partial
 
@@ -306,17 +411,78 @@ class ParseTreeRep(ParseTree):
         return self.parse == other.parse
 
     def make_nice_string(self, start_column: int) -> str:
+        return _render(self, start_column, _make_nice_tree_pieces)
+
+
+def _make_nice_tree_pieces(item, start_column: int) -> list:
+    if isinstance(item, SPPF):
+        if len(item) == 0:
+            return ["(empty)"]
+        elif len(item) == 1:
+            return [(item[0], start_column)]
+        else:
+            leader = "(choice "
+            indent = start_column + len(leader)
+            pieces = [leader, (item[0], indent)]
+            for tree in item[1:]:
+                pieces.append("\n" + (" " * indent))
+                pieces.append((tree, indent))
+            pieces.append(")")
+            return pieces
+    elif item.kind == TREE_PAIR_KIND:
+        leader = "(pair "
+        indent = start_column + len(leader)
+        return [leader, (item.left, indent), "\n" + (" " * indent), (item.right, indent), ")"]
+    elif item.kind == TREE_REP_KIND:
         leader = "(repeat "
         indent = start_column + len(leader)
-        return leader + self.parse.make_nice_string(indent) + ")"
+        return [leader, (item.parse, indent), ")"]
+    else:
+        return [item.make_nice_string(start_column)]
 
 
 class Language(ABC):
+    # Languages are allocated by the hundred for every token, so they keep their fields in slots rather than in a
+    # `__dict__`.
+    __slots__ = (
+        # Set on nodes which are known to be unchanged by `compact`.
+        '_compacted',
+        # Cached results of the nullability and emptiness analyses, or None if not yet computed.
+        '_nullable',
+        '_empty',
+        # The FIRST set assigned by `RuleDict.compute_first_sets`, or None if it is not known.
+        '_first',
+        # Structural hash assigned by `_hash_cons`. Nodes built through the language constructors are unique per
+        # structure, so equality is identity.
+        '_hash',
+        # Hash-consed nodes are only held weakly.
+        '__weakref__',
+    )
+    kind: int = None
+
+    def __init__(self, nullable: Optional[bool] = None, empty_lang: Optional[bool] = None):
+        self._compacted = False
+        self._nullable = nullable
+        self._empty = empty_lang
+        self._first = None
+        self._hash = None
+
+    def __eq__(self, other):
+        return self is other
+
     def __hash__(self):
-        return hash(repr(self))
+        if self._hash is None:
+            self._hash = id(self)
+        return self._hash
 
 
 class Empty(Language):
+    __slots__ = ()
+    kind = EMPTY_KIND
+
+    def __init__(self):
+        super().__init__(False, True)
+
     def __repr__(self):
         return "∅"
 
@@ -324,43 +490,79 @@ class Empty(Language):
         return isinstance(other, Empty)
 
     def __hash__(self):
-        return super().__hash__()
+        return hash(Empty)
+
+
+# Every empty language is the same, so `empty` always returns this one.
+_EMPTY = Empty()
 
 
 class Epsilon(Language):
-    def __init__(self, func: EpsFunc):
+    """
+    The empty string, producing either a fixed parse `value` or the parse computed by calling `func`. Since that parse
+    cannot depend on where the epsilon occurs (epsilons producing the bound token are TokenEpsilons instead), `func`
+    is called at most once and its result kept as the value.
+    """
+    __slots__ = ('func', 'value')
+    kind = EPSILON_KIND
+
+    def __init__(self, func: Optional[EpsFunc] = None, value: Optional[SPPF] = None):
+        super().__init__(True, False)
         self.func = func
+        self.value = value
 
     def __repr__(self):
         return "ε"
 
-    def __eq__(self, other):
-        return other is self
-
-    def __hash__(self):
-        return super().__hash__()
-
 
 class Literal(Language):
+    """
+    A single token. Values which carry a `terminal_id` (lexemes and grammar tokens) are matched by comparing that ID
+    with the token's, and then comparing texts if the value has a `terminal_text`. An ID of 0 matches tokens of any
+    kind. Other values are matched with `==`.
+    """
+    __slots__ = ('value', 'terminal_id', 'terminal_text')
+    kind = LITERAL_KIND
+
     def __init__(self, value):
+        super().__init__(False, False)
         self.value = value
+        self.terminal_id: Optional[int] = getattr(value, 'terminal_id', None)
+        self.terminal_text: Optional[str] = getattr(value, 'terminal_text', None)
+
+    def matches(self, c) -> bool:
+        terminal_id = self.terminal_id
+        if terminal_id is None:
+            return self.value == c
+        if terminal_id and terminal_id != getattr(c, 'terminal_id', None):
+            return False
+        text = self.terminal_text
+        return text is None or text == getattr(c, 'text', None)
 
     def __repr__(self):
         return str(self.value)
 
-    def __eq__(self, other):
-        if not isinstance(other, Literal):
-            return False
-        return other.value == self.value
-
-    def __hash__(self):
-        return super().__hash__()
-
 
 class RuleLiteral(Language):
+    __slots__ = ('name', 'grammar', 'derivatives')
+    kind = RULE_KIND
+
     def __init__(self, name: str, grammar):
+        super().__init__()
         self.name = name
         self.grammar = grammar
+        # Rule dictionaries built by the linguifier own a derivative cache; plain dictionaries do not.
+        self.derivatives: Optional[DerivativeCache] = getattr(grammar, 'derivatives', None)
+
+    def __getstate__(self):
+        # The derivative cache belongs to the grammar, so it is picked up from there again when unpickling. The FIRST
+        # set is kept, as it is for every other node, so that it need not be recomputed.
+        return self.name, self.grammar, self._first
+
+    def __setstate__(self, state):
+        name, grammar, first = state
+        self.__init__(name, grammar)
+        self._first = first
 
     @property
     def lang(self) -> Language:
@@ -369,17 +571,13 @@ class RuleLiteral(Language):
     def __repr__(self):
         return "<" + self.name + ">"
 
-    def __eq__(self, other):
-        if not isinstance(other, RuleLiteral):
-            return False
-        return other.name == self.name
-
-    def __hash__(self):
-        return super().__hash__()
-
 
 class DelayRule(Language):
+    __slots__ = ('lang', 'c', '_derivative')
+    kind = DELAY_KIND
+
     def __init__(self, rule: RuleLiteral, c):
+        super().__init__()
         self.lang = rule
         self.c = c
         self._derivative = None
@@ -387,6 +585,8 @@ class DelayRule(Language):
     @property
     def derivative(self) -> Language:
         if self._derivative is None:
+            if _STATS is not None:
+                _STATS.delay_forcings += 1
             self._derivative = derive(self.lang.lang, self.c)
         return self._derivative
 
@@ -397,93 +597,141 @@ class DelayRule(Language):
     def __repr__(self):
         return "@D[" + repr(self.c) + "](" + repr(self.lang) + ")"
 
-    def __eq__(self, other):
-        if not isinstance(other, DelayRule):
-            return False
-        return other.lang == self.lang and other.c == self.c
-
-    def __hash__(self):
-        return super().__hash__()
-
 
 class Concat(Language):
+    __slots__ = ('left', 'right')
+    kind = CONCAT_KIND
+
     def __init__(self, left: Language, right: Language):
+        super().__init__()
         self.left = left
         self.right = right
 
     def __repr__(self):
-        if isinstance(self.right, Epsilon):
-            return repr(self.left)
-        if self._all_chars():
-            return repr(self.left) + " ◦ " + repr(self.right)
-        else:
-            return "{" + repr(self.left) + " ◦ " + repr(self.right) + "}"
+        return _render(self, 0, _repr_pieces)
 
     def _all_chars(self):
-        if isinstance(self.left, Literal):
-            if isinstance(self.right, Literal):
+        lang = self
+        while lang.left.kind == LITERAL_KIND:
+            if lang.right.kind == LITERAL_KIND:
                 return True
-            if isinstance(self.right, Concat):
-                return self.right._all_chars()
+            if lang.right.kind != CONCAT_KIND:
+                break
+            lang = lang.right
         return False
 
-    def __eq__(self, other):
-        if not isinstance(other, Concat):
-            return False
-        return other.left == self.left and other.right == self.right
-
-    def __hash__(self):
-        return super().__hash__()
-
 
 class Alt(Language):
+    __slots__ = ('this', 'that')
+    kind = ALT_KIND
+
     def __init__(self, this: Language, that: Language):
+        super().__init__()
         self.this = this
         self.that = that
 
     def __repr__(self):
-        return "{" + repr(self.this) + " ∪ " + repr(self.that) + "}"
-
-    def __eq__(self, other):
-        if not isinstance(other, Alt):
-            return False
-        return other.this == self.this and other.that == self.that
-
-    def __hash__(self):
-        return super().__hash__()
+        return _render(self, 0, _repr_pieces)
 
 
 class Rep(Language):
+    __slots__ = ('lang',)
+    kind = REP_KIND
+
     def __init__(self, lang: Language):
+        super().__init__(True, False)
         self.lang = lang
 
     def __repr__(self):
-        return "{" + repr(self.lang) + "}*"
-
-    def __eq__(self, other):
-        if not isinstance(other, Rep):
-            return False
-        return other.lang == self.lang
-
-    def __hash__(self):
-        return super().__hash__()
+        return _render(self, 0, _repr_pieces)
 
 
 class Red(Language):
+    __slots__ = ('lang', 'func')
+    kind = RED_KIND
+
     def __init__(self, lang: Language, func: RedFunc):
+        super().__init__()
         self.lang = lang
         self.func = func
 
     def __repr__(self):
-        return "⌊" + repr(self.lang) + " --> " + repr(self.func) + "⌋"
+        return _render(self, 0, _repr_pieces)
 
-    def __eq__(self, other):
-        if not isinstance(other, Red):
-            return False
-        return other.lang == self.lang and other.func == self.func
 
-    def __hash__(self):
-        return super().__hash__()
+class TokenEpsilon(Language):
+    """
+    The empty string, producing the token bound by the nearest enclosing `Bind`. Derivatives taken with respect to a
+    `TerminalKind` use this in place of an Epsilon, since they are shared by every token of that kind.
+    """
+    __slots__ = ()
+    kind = TOKEN_EPSILON_KIND
+
+    def __init__(self):
+        super().__init__(True, False)
+
+    def __repr__(self):
+        return "τ"
+
+
+class Bind(Language):
+    """
+    Binds the token which the TokenEpsilons within `lang` produce.
+    """
+    __slots__ = ('lang', 'token')
+    kind = BIND_KIND
+
+    def __init__(self, lang: Language, token: Token):
+        super().__init__()
+        self.lang = lang
+        self.token = token
+
+    def __repr__(self):
+        return _render(self, 0, _repr_pieces)
+
+
+def _repr_pieces(lang: Language, start_column: int) -> list:
+    kind = lang.kind
+    if kind == CONCAT_KIND:
+        if lang.right.kind == EPSILON_KIND:
+            return [(lang.left, 0)]
+        if lang._all_chars():
+            return [(lang.left, 0), " ◦ ", (lang.right, 0)]
+        else:
+            return ["{", (lang.left, 0), " ◦ ", (lang.right, 0), "}"]
+    elif kind == ALT_KIND:
+        return ["{", (lang.this, 0), " ∪ ", (lang.that, 0), "}"]
+    elif kind == REP_KIND:
+        return ["{", (lang.lang, 0), "}*"]
+    elif kind == RED_KIND:
+        return ["⌊", (lang.lang, 0), " --> " + repr(lang.func) + "⌋"]
+    elif kind == BIND_KIND:
+        return ["⟦", (lang.lang, 0), " <- " + repr(lang.token) + "⟧"]
+    else:
+        return [repr(lang)]
+
+
+# Every hash-consed node, keyed by its class and the identities of its fields (or, for tokens, their values). Nodes are
+# only held weakly, so this does not keep otherwise-dead derivatives alive.
+_NODES = WeakValueDictionary()
+
+
+def _token_key(c) -> Any:
+    if type(c).__hash__ is None:
+        return id(c)
+    return type(c), c
+
+
+def _hash_cons(cls, *fields, key: Any = None) -> Language:
+    key = (cls, *map(id, fields)) if key is None else (cls, key)
+    node = _NODES.get(key)
+    if node is None:
+        node = cls(*fields)
+        node._hash = hash(key)
+        _NODES[key] = node
+        if _STATS is not None:
+            _STATS.nodes_allocated += 1
+    return node
 
 
 def linguify(token: Token) -> Language:
@@ -493,19 +741,42 @@ def linguify(token: Token) -> Language:
 
 
 def empty() -> Language:
-    return Empty()
+    return _EMPTY
 
 
 def eps(func: EpsFunc) -> Language:
+    if _STATS is not None:
+        _STATS.nodes_allocated += 1
     return Epsilon(func)
 
 
+def eps_value(value: SPPF) -> Language:
+    """
+    An epsilon producing a parse which is already known.
+    """
+    if _STATS is not None:
+        _STATS.nodes_allocated += 1
+    return Epsilon(value=value)
+
+
+def null_parse() -> SPPF:
+    """
+    The parse of an epsilon which matches nothing. This is a module-level function rather than a lambda so that
+    grammars containing such epsilons can be pickled.
+    """
+    return _EPS_SPPF
+
+
 def literal(c) -> Language:
-    return Literal(c)
+    return _hash_cons(Literal, c, key=_token_key(c))
+
+
+def rule_literal(name: str, grammar) -> Language:
+    return _hash_cons(RuleLiteral, name, grammar, key=(name, id(grammar)))
 
 
 def delay(rl: RuleLiteral, c) -> Language:
-    return DelayRule(rl, c)
+    return _hash_cons(DelayRule, rl, c, key=(id(rl), _token_key(c)))
 
 
 def concat(l1: Language, *ls: Language) -> Language:
@@ -514,15 +785,15 @@ def concat(l1: Language, *ls: Language) -> Language:
         return l1
     elif len(ls) == 1:
         l2 = linguify(ls[0])
-        if isinstance(l1, Empty) or isinstance(l2, Empty):
+        if l1.kind == EMPTY_KIND or l2.kind == EMPTY_KIND:
             return empty()
-        if isinstance(l1, Epsilon):
+        if l1.kind == EPSILON_KIND:
             return red(l2, LeftEpsRedFunc(parse_null(l1)))
-        if isinstance(l2, Epsilon):
+        if l2.kind == EPSILON_KIND:
             return red(l1, RightEpsRedFunc(parse_null(l2)))
-        return Concat(l1, l2)
+        return _hash_cons(Concat, l1, l2)
     else:
-        return Concat(l1, concat(*ls))
+        return _hash_cons(Concat, l1, concat(*ls))
 
 
 def alt(l1: Language, *ls: Language) -> Language:
@@ -531,21 +802,21 @@ def alt(l1: Language, *ls: Language) -> Language:
         return l1
     elif len(ls) == 1:
         l2 = ls[0]
-        if isinstance(l1, Empty):
+        if l1.kind == EMPTY_KIND:
             return l2
-        if isinstance(l2, Empty):
+        if l2.kind == EMPTY_KIND:
             return l1
-        return Alt(l1, l2)
+        return _hash_cons(Alt, l1, l2)
     else:
-        return Alt(l1, alt(*ls))
+        return _hash_cons(Alt, l1, alt(*ls))
 
 
 def rep(lang: Language) -> Language:
-    return Rep(linguify(lang))
+    return _hash_cons(Rep, linguify(lang))
 
 
 def list_rep(lang: Language) -> Language:
-    return red(Rep(linguify(lang)), ListRepRedFunc())
+    return red(rep(lang), ListRepRedFunc())
 
 
 def min_rep(lang: Language) -> Language:
@@ -583,7 +854,7 @@ def sep_rep(sep_lang: Language, lang: Language) -> Language:
              / \
             s   w
     """
-    return red(alt(red(eps(lambda: SPPF(ParseTreeEps())), SepRepEpsRedFunc()),
+    return red(alt(red(eps(null_parse), SepRepEpsRedFunc()),
                    concat(lang, rep(red(concat(sep_lang, lang), SepRepConcatRedFunc())))),
                SepRepRedFunc())
 
@@ -607,11 +878,19 @@ def min_sep_rep(sep_lang: Language, lang: Language) -> Language:
 
 
 def opt(lang: Language) -> Language:
-    return alt(lang, eps(lambda: SPPF(ParseTreeEps())))
+    return alt(lang, eps(null_parse))
 
 
 def red(lang: Language, f: RedFunc) -> Language:
-    return Red(linguify(lang), f)
+    return _hash_cons(Red, linguify(lang), f)
+
+
+def token_eps() -> Language:
+    return _hash_cons(TokenEpsilon)
+
+
+def bind(lang: Language, token: Token) -> Language:
+    return _hash_cons(Bind, lang, token)
 
 
 def is_empty(sppf: SPPF) -> bool:
@@ -619,173 +898,1052 @@ def is_empty(sppf: SPPF) -> bool:
 
 
 def is_eps(sppf: SPPF) -> bool:
-    return len(sppf) == 1 and isinstance(sppf[0], ParseTreeEps)
+    return len(sppf) == 1 and sppf[0].kind == TREE_EPS_KIND
+
+
+def _analysis_children(lang: Language) -> tuple:
+    kind = lang.kind
+    if kind == CONCAT_KIND:
+        return lang.left, lang.right
+    elif kind == ALT_KIND:
+        return lang.this, lang.that
+    elif kind == DELAY_KIND:
+        return lang.derivative,
+    elif kind == RULE_KIND or kind == RED_KIND or kind == BIND_KIND:
+        return lang.lang,
+    else:
+        raise ValueError(f"cannot analyse unknown language: {lang}")
+
+
+def _least_fixed_point(lang: Language, attr: str, negate: bool = False) -> bool:
+    """
+    Computes a boolean property of a (possibly cyclic) language graph as a least fixed point, starting every node from
+    False and re-evaluating until no approximation changes. The result for each node reached in the final pass is
+    cached in the node's `attr` attribute (negated if `negate` is set) so later queries are constant-time.
+
+    Leaf nodes carry their values as class attributes. A Concat has the property if both of its children do, an Alt if
+    either child does, and every other node if its only child does. The graph is walked with an explicit stack of
+    frames, so its depth is not limited by the interpreter's recursion limit.
+    """
+    approximations = {}
+    while True:
+        visited = {}
+        needs_another_pass = False
+        changed = False
+        # Each frame holds a node being computed, its children, and the index of the child being visited.
+        frames = []
+        node = lang
+        while True:
+            cached = getattr(node, attr)
+            if cached is not None:
+                value = cached != negate
+            else:
+                key = id(node)
+                if key in visited:
+                    if visited[key] is None:
+                        # This node is still being computed, so we have found a cycle and must rely on the
+                        # approximation.
+                        needs_another_pass = True
+                    value = approximations.get(key, False)
+                else:
+                    visited[key] = None
+                    children = _analysis_children(node)
+                    frames.append([node, children, 0])
+                    node = children[0]
+                    continue
+            # Return the value to the waiting frames, finishing each one whose value is now decided.
+            while frames:
+                frame = frames[-1]
+                parent, children, index = frame
+                index += 1
+                if index < len(children) and value == (parent.kind == CONCAT_KIND):
+                    # A Concat needs both children to have the property, and an Alt either, so visit the other child.
+                    frame[2] = index
+                    node = children[index]
+                    break
+                frames.pop()
+                key = id(parent)
+                if approximations.get(key, False) != value:
+                    approximations[key] = value
+                    changed = True
+                visited[key] = parent
+            else:
+                result = value
+                break
+        if not (needs_another_pass and changed):
+            break
+    for key, node in visited.items():
+        setattr(node, attr, approximations.get(key, False) != negate)
+    return result
 
 
 def is_nullable(lang: Language) -> bool:
-    if isinstance(lang, Empty):
-        return False
-    if isinstance(lang, Epsilon):
-        return True
-    if isinstance(lang, Literal):
-        return False
-    if isinstance(lang, RuleLiteral):
-        return is_nullable(lang.lang)
-    if isinstance(lang, DelayRule):
-        return is_nullable(lang.derivative)
-    if isinstance(lang, Alt):
-        return is_nullable(lang.this) or is_nullable(lang.that)
-    if isinstance(lang, Concat):
-        return is_nullable(lang.left) and is_nullable(lang.right)
-    if isinstance(lang, Rep):
-        return True
-    if isinstance(lang, Red):
-        return is_nullable(lang.lang)
-    raise ValueError(f"is_nullable: unknown language: {lang}")
-
-
-DERIVATIVES = defaultdict(dict)
-
-
-def _derivative_exists(lang: Language, c) -> bool:
-    if lang not in DERIVATIVES:
-        return False
-    if c not in DERIVATIVES[lang]:
-        return False
-    return True
+    nullable = lang._nullable
+    if nullable is None:
+        nullable = _least_fixed_point(lang, '_nullable')
+    return nullable
 
 
-def derive(lang: Language, c) -> Language:
-    if isinstance(lang, Empty):
-        return empty()
-    if isinstance(lang, Epsilon):
-        return empty()
-    if isinstance(lang, Literal):
-        return eps(lambda: SPPF(ParseTreeChar(c))) if lang.value == c else empty()
-    if isinstance(lang, RuleLiteral):
-        if not _derivative_exists(lang, c):
-            DERIVATIVES[lang][c] = delay(lang, c)
-        thunk: DelayRule = DERIVATIVES[lang][c]
-        if thunk.is_null:
+def is_empty_language(lang: Language) -> bool:
+    """
+    Whether the language accepts no strings at all. This is the complement of the least fixed point of "can produce
+    some string", which is the analysis that terminates correctly on cyclic rule graphs.
+    """
+    empty_lang = lang._empty
+    if empty_lang is None:
+        empty_lang = not _least_fixed_point(lang, '_empty', negate=True)
+    return empty_lang
+
+
+def first_terminals(lang: Language) -> List[Token]:
+    """
+    Finds the terminals which can begin a string of the language, i.e. the tokens it is able to accept next. Each
+    terminal is given once, in the order in which it appears in the language.
+    """
+    terminals = {}
+    seen = set()
+    stack = [lang]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen or is_empty_language(node):
+            continue
+        seen.add(id(node))
+        kind = node.kind
+        if kind == LITERAL_KIND:
+            # Literals are hash-consed, so their identities tell equal terminals apart (even unhashable ones).
+            terminals[id(node)] = node.value
+        elif kind == CONCAT_KIND:
+            if is_nullable(node.left):
+                stack.append(node.right)
+            stack.append(node.left)
+        elif kind == ALT_KIND:
+            stack.append(node.that)
+            stack.append(node.this)
+        elif kind == DELAY_KIND:
+            stack.append(node.derivative)
+        elif kind == RULE_KIND or kind == REP_KIND or kind == RED_KIND or kind == BIND_KIND:
+            stack.append(node.lang)
+    return list(terminals.values())
+
+
+DerivativeCacheStats = NamedTuple('DerivativeCacheStats', [('size', int), ('max_size', Optional[int]), ('hits', int),
+                                                           ('misses', int), ('evictions', int)])
+
+
+class DerivativeCache:
+    """
+    Remembers the (delayed) derivative of each rule with respect to each token, evicting the least-recently-used
+    entries once `max_size` is exceeded. A `max_size` of None leaves the cache unbounded.
+    """
+    def __init__(self, max_size: Optional[int] = None):
+        self.max_size = max_size
+        self._derivatives: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._derivatives)
+
+    def __contains__(self, item):
+        return item in self._derivatives
+
+    def derivative(self, rule: RuleLiteral, c) -> 'DelayRule':
+        key = (rule, c)
+        thunk = self._derivatives.get(key)
+        if thunk is not None:
+            self.hits += 1
+            if _STATS is not None:
+                _STATS.cache_hits += 1
+            self._derivatives.move_to_end(key)
             return thunk
-        else:
-            return thunk.derivative
-    if isinstance(lang, DelayRule):
-        return derive(lang.derivative, c)
-    if isinstance(lang, Concat):
-        left = lang.left
-        dcl_r = concat(derive(left, c), lang.right)
-        if is_nullable(left):
-            return alt(dcl_r, concat(eps(lambda: parse_null(left)), derive(lang.right, c)))
-        else:
-            return dcl_r
-    if isinstance(lang, Alt):
-        return alt(derive(lang.this, c), derive(lang.that, c))
-    if isinstance(lang, Rep):
-        return concat(derive(lang.lang, c), lang)
-    if isinstance(lang, Red):
-        inner = derive(lang.lang, c)
-        if isinstance(inner, Empty):
-            return empty()
-        else:
-            return red(inner, lang.func)
-    raise ValueError(f"derive: unknown language: {lang}")
+        self.misses += 1
+        if _STATS is not None:
+            _STATS.cache_misses += 1
+        thunk = delay(rule, c)
+        self._derivatives[key] = thunk
+        if self.max_size is not None and len(self._derivatives) > self.max_size:
+            self._derivatives.popitem(last=False)
+            self.evictions += 1
+        return thunk
 
+    def clear(self):
+        self._derivatives.clear()
 
-def parse_null(lang: Language) -> SPPF:
-    if isinstance(lang, Empty):
-        return SPPF()
-    if isinstance(lang, Epsilon):
-        return lang.func()
-    if isinstance(lang, Literal):
-        return SPPF()
-    if isinstance(lang, RuleLiteral):
-        return parse_null(lang.lang)
-    if isinstance(lang, DelayRule):
-        return parse_null(lang.derivative)
-    if isinstance(lang, Concat):
-        left_parse = parse_null(lang.left)
-        if is_empty(left_parse):
-            return SPPF()
-        right_parse = parse_null(lang.right)
-        if is_empty(right_parse):
-            return SPPF()
-        return SPPF(ParseTreePair(left_parse, right_parse))
-    if isinstance(lang, Alt):
-        this_parse = parse_null(lang.this)
-        that_parse = parse_null(lang.that)
-        if is_empty(this_parse):
-            return that_parse
-        else:
-            if is_empty(that_parse):
-                return this_parse
+    def stats(self) -> DerivativeCacheStats:
+        return DerivativeCacheStats(len(self), self.max_size, self.hits, self.misses, self.evictions)
+
+
+class ParserStats:
+    """
+    Counts the work done by the derivative engine while it is being collected by `parser_stats`.
+    """
+    def __init__(self):
+        # The nodes visited by `derive`, by kind.
+        self.derives = [0] * (max(_KIND_NAMES) + 1)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.delay_forcings = 0
+        self.nodes_allocated = 0
+        self.tokens = 0
+        self.parse_null_calls = 0
+        self.red_func_calls = 0
+
+    def derives_by_kind(self) -> Dict[str, int]:
+        return {name: self.derives[kind] for kind, name in _KIND_NAMES.items()}
+
+    @property
+    def nodes_per_token(self) -> float:
+        return self.nodes_allocated / self.tokens if self.tokens else 0.0
+
+    def report(self) -> str:
+        lines = [
+            f"tokens:            {self.tokens}",
+            f"derive calls:      {sum(self.derives)}",
+        ]
+        lines.extend(f"  {name + ':':<17}{count}" for name, count in self.derives_by_kind().items() if count)
+        lines.extend([
+            f"cache hits:        {self.cache_hits}",
+            f"cache misses:      {self.cache_misses}",
+            f"delay forcings:    {self.delay_forcings}",
+            f"nodes allocated:   {self.nodes_allocated} ({self.nodes_per_token:.1f} per token)",
+            f"parse_null calls:  {self.parse_null_calls}",
+            f"RedFunc calls:     {self.red_func_calls}",
+        ])
+        return "\n".join(lines)
+
+
+_KIND_NAMES = {cls.kind: cls.__name__ for cls in (Empty, Epsilon, Literal, RuleLiteral, DelayRule, Concat, Alt, Rep, Red,
+                                                  TokenEpsilon, Bind)}
+
+# The counters being collected, or None when `parser_stats` is not in use. Every counter is guarded by a check of this,
+# so collection costs nothing while it is off.
+_STATS: Optional[ParserStats] = None
+
+
+@contextmanager
+def parser_stats() -> Iterator[ParserStats]:
+    """
+    Collects counts of the derivative engine's work for the duration of the `with` block:
+
+        with parser_stats() as stats:
+            GRAMMAR.parse_file(lexemes)
+        print(stats.report())
+    """
+    global _STATS
+    previous = _STATS
+    stats = ParserStats()
+    _STATS = stats
+    try:
+        yield stats
+    finally:
+        _STATS = previous
+
+
+class TerminalKind:
+    """
+    The part of a token which a grammar can distinguish: its class, plus its text if some literal in the grammar
+    matches on that text. Every token of a kind matches exactly the same literals, so rule derivatives are taken and
+    cached per kind rather than per token.
+    """
+    def __init__(self, token: Token, text: Optional[str]):
+        # A token of this kind, which stands in for all of them when matching literals.
+        self.token = token
+        self.text = text
+
+    def __repr__(self):
+        if self.text is None:
+            return type(self.token).__name__
+        return repr(self.token)
+
+
+class RuleDict(dict):
+    """
+    Maps the names of a grammar's rules to their languages, and owns the derivative cache used by the RuleLiterals
+    which refer to those rules.
+    """
+    def __init__(self, cache_size: Optional[int] = None):
+        super().__init__()
+        self.derivatives = DerivativeCache(cache_size)
+        self._literal_texts = None
+        self._terminal_kinds: Dict[Any, TerminalKind] = {}
+        self._last_token = None
+        self._last_kind = None
+        self._has_first_sets = False
+
+    def __setitem__(self, name: str, lang: Language):
+        old_lang = self.get(name)
+        super().__setitem__(name, lang)
+        if old_lang is not None:
+            # The nullability and emptiness cached on the nodes which reach the old rule may no longer hold.
+            self._clear_analyses(old_lang)
+        # A new rule can make more of a token's text visible, which invalidates the kinds derived so far.
+        self._literal_texts = None
+        self._terminal_kinds.clear()
+        self._last_token = self._last_kind = None
+        self.derivatives.clear()
+        # It also changes what the rules referring to it can start with.
+        if self._has_first_sets:
+            self.compute_first_sets()
+
+    def _clear_analyses(self, old_lang: Language):
+        """
+        Clears the cached analyses of every node which can reach one of this grammar's rules: the rules themselves (as
+        they were and as they are), and the RuleLiterals referring to them. Nodes built outside the grammar on top of
+        its RuleLiterals are not found, so they keep whatever they have cached.
+        """
+        stack = [old_lang, *self.values()]
+        for name in self:
+            rule = _NODES.get((RuleLiteral, (name, id(self))))
+            if rule is not None:
+                stack.append(rule)
+        seen = set()
+        while stack:
+            lang = stack.pop()
+            if id(lang) in seen:
+                continue
+            seen.add(id(lang))
+            kind = lang.kind
+            if kind == CONCAT_KIND:
+                stack.append(lang.left)
+                stack.append(lang.right)
+            elif kind == ALT_KIND:
+                stack.append(lang.this)
+                stack.append(lang.that)
+            elif kind == RED_KIND or kind == BIND_KIND:
+                stack.append(lang.lang)
+            elif kind == RULE_KIND:
+                if lang.grammar is self and lang.name in self:
+                    stack.append(lang.lang)
             else:
-                return this_parse + that_parse
-    if isinstance(lang, Rep):
-        rep_parse = parse_null(lang.lang)
-        if is_empty(rep_parse):
-            # Repeats produce epsilons instead of empties due to nullability.
-            return SPPF(ParseTreeEps())
+                # The analyses of the other nodes are fixed when they are made, whatever they contain.
+                if kind == REP_KIND:
+                    stack.append(lang.lang)
+                continue
+            lang._nullable = lang._empty = None
+
+    def __reduce__(self):
+        # Rules are restored through `__setitem__`, and the derivatives (which are only valid for this process's
+        # nodes) are left behind. The nodes bring their FIRST sets with them.
+        return RuleDict, (self.derivatives.max_size,), self._has_first_sets, None, iter(self.items())
+
+    def __setstate__(self, has_first_sets: bool):
+        self._has_first_sets = has_first_sets
+
+    def compute_first_sets(self):
+        """
+        Gives every node of the grammar its FIRST set: the terminals which can begin its strings, as (terminal ID, text)
+        pairs in which a text of None stands for any text. Nodes containing a literal without a terminal ID could begin
+        with anything, so their FIRST set is None. `derive` uses these to skip the alternatives which cannot begin with
+        the token being derived.
+        """
+        nodes = []
+        seen = set()
+        stack = list(self.values())
+        while stack:
+            lang = stack.pop()
+            if id(lang) in seen:
+                continue
+            seen.add(id(lang))
+            nodes.append(lang)
+            kind = lang.kind
+            if kind == CONCAT_KIND:
+                stack.append(lang.left)
+                stack.append(lang.right)
+            elif kind == ALT_KIND:
+                stack.append(lang.this)
+                stack.append(lang.that)
+            elif kind == REP_KIND or kind == RED_KIND or kind == BIND_KIND:
+                stack.append(lang.lang)
+            elif kind == RULE_KIND and lang.grammar is self and lang.name in self:
+                stack.append(lang.lang)
+        # Rules can refer to each other in cycles, so the sets are grown from nothing until none of them changes.
+        # Children are mostly found after their parents, so they are updated first.
+        first: Dict[int, Optional[frozenset]] = {id(lang): frozenset() for lang in nodes}
+        changed = True
+        while changed:
+            changed = False
+            for lang in reversed(nodes):
+                lang_first = _first_set(lang, first)
+                if lang_first != first[id(lang)]:
+                    first[id(lang)] = lang_first
+                    changed = True
+        for lang in nodes:
+            lang._first = first[id(lang)]
+        self._has_first_sets = True
+
+    def terminal_kind(self, c: Token) -> Optional[TerminalKind]:
+        """
+        Finds the kind of a token as seen by this grammar, or None if the token's kind cannot be determined (in which
+        case derivatives must be taken with respect to the token itself).
+        """
+        if c is self._last_token:
+            return self._last_kind
+        if self._literal_texts is None:
+            self._literal_texts = self._find_literal_texts()
+        text = getattr(c, 'text', None)
+        if self._literal_texts is False or text is None:
+            kind = None
         else:
-            return SPPF(ParseTreeRep(rep_parse))
-    if isinstance(lang, Red):
-        return lang.func(parse_null(lang.lang))
-    raise ValueError(f"parse_null: unknown language: {lang}")
+            key = (type(c), text if text in self._literal_texts else None)
+            kind = self._terminal_kinds.get(key)
+            if kind is None:
+                kind = TerminalKind(c, key[1])
+                self._terminal_kinds[key] = kind
+        self._last_token = c
+        self._last_kind = kind
+        return kind
+
+    def _find_literal_texts(self):
+        """
+        Collects the texts which the grammar's literals match on, or returns False if some literal has no terminal ID
+        (and so might match on anything).
+        """
+        texts = set()
+        seen = set()
+        stack = list(self.values())
+        while stack:
+            lang = stack.pop()
+            if id(lang) in seen:
+                continue
+            seen.add(id(lang))
+            kind = lang.kind
+            if kind == LITERAL_KIND:
+                if lang.terminal_id is None:
+                    return False
+                if lang.terminal_text is not None:
+                    texts.add(lang.terminal_text)
+            elif kind == CONCAT_KIND:
+                stack.append(lang.left)
+                stack.append(lang.right)
+            elif kind == ALT_KIND:
+                stack.append(lang.this)
+                stack.append(lang.that)
+            elif kind == REP_KIND or kind == RED_KIND:
+                stack.append(lang.lang)
+        return texts
+
+
+def _first_set(lang: Language, first: Dict[int, Optional[frozenset]]) -> Optional[frozenset]:
+    kind = lang.kind
+    if kind == LITERAL_KIND:
+        if lang.terminal_id is None or (not lang.terminal_id and lang.terminal_text is None):
+            return None
+        return frozenset([(lang.terminal_id, lang.terminal_text)])
+    elif kind == EMPTY_KIND or kind == EPSILON_KIND or kind == TOKEN_EPSILON_KIND:
+        return frozenset()
+    elif kind == CONCAT_KIND:
+        left = first.get(id(lang.left))
+        if left is None or not is_nullable(lang.left):
+            return left
+        right = first.get(id(lang.right))
+        return None if right is None else left | right
+    elif kind == ALT_KIND:
+        this = first.get(id(lang.this))
+        that = first.get(id(lang.that))
+        return None if this is None or that is None else this | that
+    elif kind == REP_KIND or kind == RED_KIND or kind == BIND_KIND:
+        return first.get(id(lang.lang))
+    elif kind == RULE_KIND and lang.name in lang.grammar:
+        # Rules of other grammars are not in `first`, and so are not known.
+        return first.get(id(lang.lang))
+    return None
+
+
+def _first_keys(c) -> Optional[Tuple]:
+    """
+    The FIRST set entries which would let a language begin with the token `c`, or None if `c` has no terminal ID.
+    """
+    token = c.token if type(c) is TerminalKind else c
+    terminal_id = getattr(token, 'terminal_id', None)
+    if terminal_id is None:
+        return None
+    text = getattr(token, 'text', None)
+    return (terminal_id, None), (terminal_id, text), (0, text)
+
+
+# The tokens bound by the `Bind` nodes enclosing the part of a language currently being derived or parsed.
+_BOUND_TOKENS: List[Token] = []
+
+
+# Operations on the explicit stacks used by `derive`, `parse_null`, `collapse_parse`, and `compact`. Each stack entry is
+# an (operation, argument) pair: _VISIT starts work on a node, _MEMO records the result just produced under the key
+# given as the argument, and the others combine the results of a node's children once they are all available.
+# (`collapse_parse` also uses _TREE to add a parse tree to the SPPF being built for its parent.)
+_VISIT = 0
+_MEMO = 1
+_CONCAT_LEFT = 2
+_CONCAT_RIGHT = 3
+_ALT = 4
+_REP = 5
+_RED = 6
+_BIND = 7
+_TREE = 8
+
+
+def derive(lang: Language, c) -> Language:
+    """
+    Derives the language with respect to the token `c`. The traversal keeps its own stack instead of recursing, so
+    arbitrarily deep languages can be derived, and remembers the derivative of each node within each Bind context so
+    that shared subgraphs are derived only once.
+    """
+    bound = _BOUND_TOKENS
+    depth = len(bound)
+    memo = {}
+    results = []
+    stack = [(_VISIT, lang)]
+    stats = _STATS
+    keys = _first_keys(c)
+    try:
+        while stack:
+            op, node = stack.pop()
+            if op == _VISIT:
+                if stats is not None:
+                    stats.derives[node.kind] += 1
+                empty_lang = node._empty
+                if empty_lang is None:
+                    empty_lang = is_empty_language(node)
+                if empty_lang:
+                    # Nothing can be derived from a language which accepts no strings.
+                    results.append(empty())
+                    continue
+                kind = node.kind
+                handler = _DERIVE_LEAF_HANDLERS.get(kind)
+                if handler is not None:
+                    results.append(handler(node, c))
+                    continue
+                key = (id(node), id(bound[-1]) if bound else None)
+                if key in memo:
+                    derivative = memo[key]
+                    if derivative is None:
+                        raise ValueError("derive: cannot derive a left-recursive language")
+                    results.append(derivative)
+                    continue
+                memo[key] = None
+                stack.append((_MEMO, key))
+                if kind == DELAY_KIND:
+                    stack.append((_VISIT, node.derivative))
+                elif kind == CONCAT_KIND:
+                    stack.append((_CONCAT_LEFT, node))
+                    stack.append((_VISIT, node.left))
+                elif kind == ALT_KIND:
+                    # Alternatives whose FIRST sets rule out the token derive to the empty language, so they are
+                    # skipped (along with the union, if only one alternative is left).
+                    this = node.this
+                    that = node.that
+                    if keys is not None:
+                        if this._first is not None and this._first.isdisjoint(keys):
+                            this = None
+                        if that._first is not None and that._first.isdisjoint(keys):
+                            that = None
+                    if this is None and that is None:
+                        results.append(empty())
+                    elif this is None or that is None:
+                        stack.append((_VISIT, that if this is None else this))
+                    else:
+                        stack.append((_ALT, node))
+                        stack.append((_VISIT, that))
+                        stack.append((_VISIT, this))
+                elif kind == REP_KIND:
+                    stack.append((_REP, node))
+                    stack.append((_VISIT, node.lang))
+                elif kind == RED_KIND:
+                    stack.append((_RED, node))
+                    stack.append((_VISIT, node.lang))
+                elif kind == BIND_KIND:
+                    stack.append((_BIND, node))
+                    bound.append(node.token)
+                    stack.append((_VISIT, node.lang))
+                else:
+                    raise ValueError(f"derive: unknown language: {node}")
+            elif op == _MEMO:
+                memo[node] = results[-1]
+            elif op == _CONCAT_LEFT:
+                results.append(concat(results.pop(), node.right))
+                if is_nullable(node.left):
+                    stack.append((_CONCAT_RIGHT, node))
+                    stack.append((_VISIT, node.right))
+            elif op == _CONCAT_RIGHT:
+                # The parse of the left side is taken now, while the tokens bound around it are known, rather than
+                # deferred in an epsilon.
+                right = results.pop()
+                if right.kind != EMPTY_KIND:
+                    results.append(alt(results.pop(), red(right, LeftEpsRedFunc(parse_null(node.left)))))
+            elif op == _ALT:
+                that = results.pop()
+                results.append(alt(results.pop(), that))
+            elif op == _REP:
+                results.append(concat(results.pop(), node))
+            elif op == _RED:
+                inner = results.pop()
+                results.append(empty() if inner.kind == EMPTY_KIND else red(inner, node.func))
+            elif op == _BIND:
+                bound.pop()
+                inner = results.pop()
+                results.append(empty() if inner.kind == EMPTY_KIND else bind(inner, node.token))
+    finally:
+        del bound[depth:]
+    return results.pop()
+
+
+def _derive_literal(lang: Literal, c) -> Language:
+    if type(c) is TerminalKind:
+        return token_eps() if lang.matches(c.token) else empty()
+    return _token_eps_value(c) if lang.matches(c) else empty()
+
+
+# The epsilon most recently made by `_token_eps_value`, and its token.
+_LAST_TOKEN_EPS = (None, None)
+
+
+def _token_eps_value(token: Token) -> Language:
+    """
+    Makes an epsilon producing the token. Every literal matching a token derives to the same epsilon, so the one made
+    for the last token is reused.
+    """
+    global _LAST_TOKEN_EPS
+    last_token, lang = _LAST_TOKEN_EPS
+    if last_token is not token:
+        lang = eps_value(SPPF(ParseTreeChar(token)))
+        _LAST_TOKEN_EPS = (token, lang)
+    return lang
+
+
+def _derive_rule(lang: RuleLiteral, c) -> Language:
+    derivatives = lang.derivatives
+    if derivatives is None:
+        thunk = delay(lang, c)
+        kind = c
+    else:
+        kind = c if type(c) is TerminalKind else lang.grammar.terminal_kind(c)
+        if kind is None:
+            kind = c
+        thunk = derivatives.derivative(lang, kind)
+    if thunk.is_null:
+        derivative = thunk
+    else:
+        derivative = thunk.derivative
+    if kind is c or derivative.kind == EMPTY_KIND:
+        return derivative
+    # The derivative is shared by every token of this kind, so bind this particular token for its TokenEpsilons.
+    return bind(derivative, c)
+
+
+_DERIVE_LEAF_HANDLERS = {
+    EMPTY_KIND:         lambda lang, c: empty(),
+    EPSILON_KIND:       lambda lang, c: empty(),
+    LITERAL_KIND:       _derive_literal,
+    RULE_KIND:          _derive_rule,
+    TOKEN_EPSILON_KIND: lambda lang, c: empty(),
+}
+
+
+def parse_null(lang: Language) -> SPPF:
+    """
+    Produces the SPPF of the language's parses of the empty string. Like `derive`, this keeps its own stack and
+    computes the SPPF of each node only once within each Bind context.
+    """
+    stats = _STATS
+    if stats is not None:
+        stats.parse_null_calls += 1
+    bound = _BOUND_TOKENS
+    depth = len(bound)
+    memo = {}
+    results = []
+    stack = [(_VISIT, lang)]
+    try:
+        while stack:
+            op, node = stack.pop()
+            if op == _VISIT:
+                kind = node.kind
+                if kind == EPSILON_KIND:
+                    value = node.value
+                    if value is None:
+                        value = node.value = node.func()
+                    results.append(value)
+                    continue
+                elif kind == EMPTY_KIND or kind == LITERAL_KIND:
+                    results.append(SPPF())
+                    continue
+                elif kind == TOKEN_EPSILON_KIND:
+                    results.append(SPPF(ParseTreeChar(bound[-1])))
+                    continue
+                key = (id(node), id(bound[-1]) if bound else None)
+                if key in memo:
+                    sppf = memo[key]
+                    if sppf is None:
+                        raise ValueError("parse_null: the language has infinitely many parses of the empty string")
+                    results.append(sppf)
+                    continue
+                memo[key] = None
+                stack.append((_MEMO, key))
+                if kind == RULE_KIND:
+                    stack.append((_VISIT, node.lang))
+                elif kind == DELAY_KIND:
+                    stack.append((_VISIT, node.derivative))
+                elif kind == CONCAT_KIND:
+                    stack.append((_CONCAT_LEFT, node))
+                    stack.append((_VISIT, node.left))
+                elif kind == ALT_KIND:
+                    stack.append((_ALT, node))
+                    stack.append((_VISIT, node.that))
+                    stack.append((_VISIT, node.this))
+                elif kind == REP_KIND:
+                    stack.append((_REP, node))
+                    stack.append((_VISIT, node.lang))
+                elif kind == RED_KIND:
+                    stack.append((_RED, node))
+                    stack.append((_VISIT, node.lang))
+                elif kind == BIND_KIND:
+                    stack.append((_BIND, node))
+                    bound.append(node.token)
+                    stack.append((_VISIT, node.lang))
+                else:
+                    raise ValueError(f"parse_null: unknown language: {node}")
+            elif op == _MEMO:
+                memo[node] = results[-1]
+            elif op == _CONCAT_LEFT:
+                if is_empty(results[-1]):
+                    results[-1] = SPPF()
+                else:
+                    stack.append((_CONCAT_RIGHT, node))
+                    stack.append((_VISIT, node.right))
+            elif op == _CONCAT_RIGHT:
+                right_parse = results.pop()
+                left_parse = results.pop()
+                if is_empty(right_parse):
+                    results.append(SPPF())
+                else:
+                    results.append(SPPF(ParseTreePair(left_parse, right_parse)))
+            elif op == _ALT:
+                that_parse = results.pop()
+                this_parse = results.pop()
+                if is_empty(this_parse):
+                    results.append(that_parse)
+                elif is_empty(that_parse):
+                    results.append(this_parse)
+                else:
+                    results.append(this_parse + that_parse)
+            elif op == _REP:
+                rep_parse = results.pop()
+                if is_empty(rep_parse):
+                    # Repeats produce epsilons instead of empties due to nullability.
+                    results.append(_EPS_SPPF)
+                else:
+                    results.append(SPPF(ParseTreeRep(rep_parse)))
+            elif op == _RED:
+                if stats is not None:
+                    stats.red_func_calls += 1
+                results.append(node.func(results.pop()))
+            elif op == _BIND:
+                bound.pop()
+    finally:
+        del bound[depth:]
+    return results.pop()
 
 
 def collapse_parse(sppf: SPPF) -> SPPF:
-    if is_empty(sppf):
-        return sppf
-    new_sppf = SPPF()
-    # Now build a new set, eliminating any empty parses.
-    for root in sppf:
-        if isinstance(root, ParseTreeEmpty):
-            # Empty parses should remain empty.
-            pass
-        elif isinstance(root, ParseTreeEps):
-            # Epsilons are needed for proper pair reduction.
-            new_sppf.append(root)
-        elif isinstance(root, ParseTreeChar):
-            # Always add terminals.
-            new_sppf.append(root)
-        elif isinstance(root, ParseTreePair):
-            left = collapse_parse(root.left)
-            right = collapse_parse(root.right)
-            if is_empty(left) or is_empty(right):
-                # Pairs must have two non-empty children.
+    """
+    Eliminates the empty parses from an SPPF, and reduces pairs with an epsilon on either side to their other side.
+    The SPPF is walked with an explicit stack, so it may be arbitrarily deep.
+    """
+    memo = {}
+    results = []
+    stack = [(_VISIT, sppf)]
+    while stack:
+        op, item = stack.pop()
+        if op == _VISIT:
+            key = id(item)
+            if key in memo:
+                results.append(memo[key])
+            elif is_empty(item):
+                results.append(item)
+            else:
+                # Now build a new set, eliminating any empty parses.
+                new_sppf = SPPF()
+                results.append(new_sppf)
+                stack.append((_MEMO, key))
+                for root in reversed(item):
+                    stack.append((_TREE, (root, new_sppf)))
+        elif op == _MEMO:
+            memo[item] = results[-1]
+        elif op == _TREE:
+            root, new_sppf = item
+            kind = root.kind
+            if kind == TREE_EMPTY_KIND:
+                # Empty parses should remain empty.
                 pass
+            elif kind == TREE_EPS_KIND or kind == TREE_CHAR_KIND:
+                # Epsilons are needed for proper pair reduction, and terminals are always added.
+                new_sppf.append(root)
+            elif kind == TREE_PAIR_KIND:
+                stack.append((_CONCAT_RIGHT, new_sppf))
+                stack.append((_VISIT, root.right))
+                stack.append((_VISIT, root.left))
+            elif kind == TREE_REP_KIND:
+                stack.append((_REP, new_sppf))
+                stack.append((_VISIT, root.parse))
             else:
-                # If either side is an epsilon, the pair can be reduced.
-                if is_eps(left):
-                    if is_eps(right):
-                        new_sppf.append(ParseTreeEps())
-                    else:
-                        for item in right:
-                            new_sppf.append(item)
-                        # new_sppf.append(right)
-                else:
-                    if is_eps(right):
-                        for item in left:
-                            new_sppf.append(item)
-                        # new_sppf.append(left)
-                    else:
-                        new_sppf.append(ParseTreePair(left, right))
-        elif isinstance(root, ParseTreeRep):
+                raise ValueError(f"collapse_parse: unknown parse tree: {root}")
+        elif op == _CONCAT_RIGHT:
+            # Both sides of a pair have been collapsed.
+            right = results.pop()
+            left = results.pop()
+            _collapse_pair(left, right, item)
+        elif op == _REP:
             # Always add the ASTRep, even if its interior parse comes up empty.
             # This ensures we can properly parse repeated tokens.
-            collapsed = collapse_parse(root.parse)
+            collapsed = results.pop()
             if is_empty(collapsed):
-                new_sppf.append(ParseTreeEps())
+                item.append(_EPS_TREE)
             else:
-                new_sppf.append(ParseTreeRep(collapsed))
+                item.append(ParseTreeRep(collapsed))
+    return results.pop()
+
+
+def _collapse_pair(left: SPPF, right: SPPF, new_sppf: SPPF):
+    if is_empty(left) or is_empty(right):
+        # Pairs must have two non-empty children.
+        pass
+    else:
+        # If either side is an epsilon, the pair can be reduced.
+        if is_eps(left):
+            if is_eps(right):
+                new_sppf.append(_EPS_TREE)
+            else:
+                for item in right:
+                    new_sppf.append(item)
+                # new_sppf.append(right)
+        else:
+            if is_eps(right):
+                for item in left:
+                    new_sppf.append(item)
+                # new_sppf.append(left)
+            else:
+                new_sppf.append(ParseTreePair(left, right))
+
+
+_COMPACT_LEAF_KINDS = {EMPTY_KIND, EPSILON_KIND, LITERAL_KIND, RULE_KIND, DELAY_KIND, TOKEN_EPSILON_KIND}
+
+
+def compact(lang: Language) -> Language:
+    """
+    Simplifies a language without changing the parses it produces, following the compaction rules from "Parsing with
+    Derivatives". Rule literals and delayed derivatives are left untouched, so the traversal never enters a cycle, and
+    the traversal keeps its own stack, so the language may be arbitrarily deep.
+
+        ∅ ◦ L       ==> ∅
+        ε ◦ L       ==> ⌊L --> (ε, _)⌋
+        L ∪ ∅       ==> L
+        {∅}*        ==> ε
+        ⌊∅ --> f⌋   ==> ∅
+        ⌊ε --> f⌋   ==> ε (producing f(ε))
+        ⌊⌊L --> f⌋ --> g⌋ ==> ⌊L --> g . f⌋
+        ⟦∅ <- t⟧    ==> ∅
+        ⟦ε <- t⟧    ==> ε
+        ⟦τ <- t⟧    ==> ε (producing t)
+    """
+    memo = {}
+    results = []
+    stack = [(_VISIT, lang)]
+    while stack:
+        op, node = stack.pop()
+        if op == _VISIT:
+            if node._compacted:
+                results.append(node)
+                continue
+            key = id(node)
+            if key in memo:
+                results.append(memo[key])
+                continue
+            kind = node.kind
+            if kind in _COMPACT_LEAF_KINDS:
+                result = node
+            elif kind == CONCAT_KIND:
+                stack.append((_CONCAT_RIGHT, node))
+                stack.append((_VISIT, node.right))
+                stack.append((_VISIT, node.left))
+                continue
+            elif kind == ALT_KIND:
+                stack.append((_ALT, node))
+                stack.append((_VISIT, node.that))
+                stack.append((_VISIT, node.this))
+                continue
+            elif kind == REP_KIND or kind == RED_KIND or kind == BIND_KIND:
+                stack.append((_COMPACT_OPS[kind], node))
+                stack.append((_VISIT, node.lang))
+                continue
+            else:
+                raise ValueError(f"compact: unknown language: {node}")
+        elif op == _MEMO:
+            # `node` was rebuilt, and the result of compacting it again is its own result.
+            result = results.pop()
+        else:
+            result = _compact_node(node, op, results, stack)
+            if result is None:
+                # The node was rebuilt in a form which needs compacting again.
+                continue
+        result._compacted = True
+        memo[id(node)] = result
+        results.append(result)
+    return results.pop()
+
+
+_COMPACT_OPS = {REP_KIND: _REP, RED_KIND: _RED, BIND_KIND: _BIND}
+
+
+def _compact_node(lang: Language, op: int, results: List[Language], stack: list) -> Optional[Language]:
+    """
+    Compacts a node whose children have already been compacted (and whose compacted children are on top of
+    `results`). Returns None if, instead, it has scheduled the compaction of a rebuilt node on `stack`.
+    """
+    if op == _CONCAT_RIGHT:
+        right = results.pop()
+        left = results.pop()
+        if left.kind == EMPTY_KIND or right.kind == EMPTY_KIND:
+            return empty()
+        elif left.kind == EPSILON_KIND or right.kind == EPSILON_KIND:
+            stack.append((_MEMO, lang))
+            stack.append((_VISIT, concat(left, right)))
+            return None
+        elif left is lang.left and right is lang.right:
+            return lang
+        else:
+            return _hash_cons(Concat, left, right)
+    elif op == _ALT:
+        that = results.pop()
+        this = results.pop()
+        if this is lang.this and that is lang.that and this.kind != EMPTY_KIND and that.kind != EMPTY_KIND:
+            return lang
+        else:
+            return alt(this, that)
+    elif op == _REP:
+        inner = results.pop()
+        if inner.kind == EMPTY_KIND:
+            return eps(null_parse)
+        elif inner is lang.lang:
+            return lang
+        else:
+            return rep(inner)
+    elif op == _RED:
+        inner = results.pop()
+        func = lang.func
+        if inner.kind == EMPTY_KIND:
+            return empty()
+        elif inner.kind == EPSILON_KIND:
+            if type(inner.func) is ReducedEpsFunc:
+                # Fuse the reductions rather than nesting the epsilons, so producing the parse does not recurse.
+                return eps(ReducedEpsFunc(inner.func.inner, ComposedRedFunc(inner.func.func, func)))
+            return eps(ReducedEpsFunc(inner, func))
+        elif inner.kind == RED_KIND:
+            return red(inner.lang, ComposedRedFunc(inner.func, func))
+        elif inner is lang.lang:
+            return lang
+        else:
+            return red(inner, func)
+    else:
+        # The node is a Bind.
+        inner = results.pop()
+        token = lang.token
+        if inner.kind == EMPTY_KIND or inner.kind == EPSILON_KIND:
+            # Ordinary epsilons never depend on the bound token.
+            return inner
+        elif inner.kind == TOKEN_EPSILON_KIND:
+            return _token_eps_value(token)
+        elif inner is lang.lang:
+            return lang
         else:
-            raise ValueError(f"collapse_parse: unknown ParseTree node: {root}")
-    return new_sppf
+            return bind(inner, token)
+
+
+ParseFailure = NamedTuple('ParseFailure', [('position', int), ('expected', List[Token])])
+ParserCheckpoint = NamedTuple('ParserCheckpoint', [('lang', Language), ('position', int),
+                                                   ('failure', Optional[ParseFailure])])
 
 
-def make_sppf(lang: Language, tokens: List[Token]) -> SPPF:
-    from functools import reduce
-    return collapse_parse(parse_null(reduce(derive, tokens, lang)))
+class ParserState:
+    """
+    Parses a stream of tokens incrementally, by deriving the language by each token as it is fed in. Derivatives never
+    modify the languages they are taken from, so a checkpoint is just the current language and can be restored at any
+    time to resume parsing from that point.
+
+    Parsing fails at the first token which leaves the language empty. The position of that token and the terminals
+    which would have been accepted in its place are recorded in `failure`, and no further derivatives are taken.
+
+    :param compaction: whether to compact the language between derivation steps (disable to compare against the
+                       uncompacted output)
+    """
+    def __init__(self, lang: Language, compaction: bool = True):
+        self.lang = lang
+        self.compaction = compaction
+        # The number of tokens fed in so far.
+        self.position = 0
+        self.failure: Optional[ParseFailure] = None
+
+    def feed(self, token: Token):
+        if _STATS is not None:
+            _STATS.tokens += 1
+        if self.failure is None:
+            lang = derive(self.lang, token)
+            if self.compaction:
+                lang = compact(lang)
+            if is_empty_language(lang):
+                self.failure = ParseFailure(self.position, first_terminals(self.lang))
+                lang = empty()
+            self.lang = lang
+        self.position += 1
+
+    def feed_all(self, tokens: List[Token]):
+        """
+        Feeds in each of the tokens, stopping early if parsing fails.
+        """
+        for token in tokens:
+            if self.failure is not None:
+                break
+            self.feed(token)
+
+    def is_accepting(self) -> bool:
+        """
+        Whether the tokens fed in so far form a complete parse.
+        """
+        return is_nullable(self.lang)
+
+    def is_viable(self) -> bool:
+        """
+        Whether the tokens fed in so far are a prefix of some parse, i.e. whether parsing can still succeed.
+        """
+        return not is_empty_language(self.lang)
+
+    def results(self) -> SPPF:
+        """
+        Produces the collapsed SPPF of the parses of the tokens fed in so far.
+        """
+        return collapse_parse(parse_null(self.lang))
+
+    def expected(self) -> List[Token]:
+        """
+        The terminals which could be fed in next without parsing failing.
+        """
+        return first_terminals(self.lang)
+
+    def checkpoint(self) -> ParserCheckpoint:
+        return ParserCheckpoint(self.lang, self.position, self.failure)
+
+    def restore(self, checkpoint: ParserCheckpoint):
+        self.lang, self.position, self.failure = checkpoint
+
+
+def make_sppf(lang: Language, tokens: List[Token], compaction: bool = True) -> SPPF:
+    """
+    Derives the language by each token in turn and returns the collapsed SPPF of the result. The SPPF is empty if the
+    tokens do not parse, in which case derivation stops at the first token which fails.
+
+    :param compaction: whether to compact the language between derivation steps (disable to compare against the
+                       uncompacted output)
+    """
+    state = ParserState(lang, compaction)
+    state.feed_all(tokens)
+    return state.results()
 
 
 def print_lang(lang: Language):
@@ -793,39 +1951,46 @@ def print_lang(lang: Language):
 
 
 def _make_nice_lang_string(lang: Language, start_column: int) -> str:
-    if isinstance(lang, Empty):
-        return "(empty)"
-    if isinstance(lang, Epsilon):
-        return "(epsilon)"
-    if isinstance(lang, Literal):
-        return "(literal " + repr(lang.value) + ")"
-    if isinstance(lang, RuleLiteral):
-        return "(rule <" + lang.name + ">)"
-    if isinstance(lang, DelayRule):
-        return "(delay <" + lang.lang.name + "> [" + ("unforced" if lang.is_null else "forced") + "])"
-    if isinstance(lang, Concat):
-        leader = "(concat "
-        indent = start_column + len(leader)
-        return (
-            leader + _make_nice_lang_string(lang.left, indent) + "\n" +
-            (" " * indent) + _make_nice_lang_string(lang.right, indent) + ")"
-        )
-    if isinstance(lang, Alt):
-        leader = "(union "
-        indent = start_column + len(leader)
-        return (
-            leader + _make_nice_lang_string(lang.this, indent) + "\n" +
-            (" " * indent) + _make_nice_lang_string(lang.that, indent) + ")"
-        )
-    if isinstance(lang, Rep):
-        leader = "(repeat "
-        indent = start_column + len(leader)
-        return leader + _make_nice_lang_string(lang.lang, indent) + ")"
-    if isinstance(lang, Red):
-        leader = "(reduce "
-        indent = start_column + len(leader)
-        return (
-            leader + _make_nice_lang_string(lang.lang, indent) + "\n" +
-            (" " * indent) + "-> " + lang.func.make_nice_string(indent) + ")"
-        )
-    raise ValueError(f"Unknown language type: {lang}")
+    return _render(lang, start_column, lambda node, column: _NICE_STRING_HANDLERS[node.kind](node, column))
+
+
+def _make_nice_binary_pieces(leader: str, left: Language, right: Language, start_column: int) -> list:
+    indent = start_column + len(leader)
+    return [leader, (left, indent), "\n" + (" " * indent), (right, indent), ")"]
+
+
+def _make_nice_rep_pieces(lang: Rep, start_column: int) -> list:
+    leader = "(repeat "
+    indent = start_column + len(leader)
+    return [leader, (lang.lang, indent), ")"]
+
+
+def _make_nice_red_pieces(lang: Red, start_column: int) -> list:
+    leader = "(reduce "
+    indent = start_column + len(leader)
+    return [leader, (lang.lang, indent), "\n" + (" " * indent) + "-> " + lang.func.make_nice_string(indent) + ")"]
+
+
+def _make_nice_bind_pieces(lang: Bind, start_column: int) -> list:
+    leader = "(bind "
+    indent = start_column + len(leader)
+    return [leader, (lang.lang, indent), "\n" + (" " * indent) + "<- " + repr(lang.token) + ")"]
+
+
+# Each handler gives the pieces of a node's string, as for `_render`.
+_NICE_STRING_HANDLERS = {
+    EMPTY_KIND:         lambda lang, start_column: ["(empty)"],
+    EPSILON_KIND:       lambda lang, start_column: ["(epsilon)"],
+    LITERAL_KIND:       lambda lang, start_column: ["(literal " + repr(lang.value) + ")"],
+    RULE_KIND:          lambda lang, start_column: ["(rule <" + lang.name + ">)"],
+    DELAY_KIND:         lambda lang, start_column: ["(delay <" + lang.lang.name + "> [" +
+                                                    ("unforced" if lang.is_null else "forced") + "])"],
+    CONCAT_KIND:        lambda lang, start_column: _make_nice_binary_pieces("(concat ", lang.left, lang.right,
+                                                                        start_column),
+    ALT_KIND:           lambda lang, start_column: _make_nice_binary_pieces("(union ", lang.this, lang.that,
+                                                                        start_column),
+    REP_KIND:           _make_nice_rep_pieces,
+    RED_KIND:           _make_nice_red_pieces,
+    TOKEN_EPSILON_KIND: lambda lang, start_column: ["(token epsilon)"],
+    BIND_KIND:          _make_nice_bind_pieces,
+}
@@ -10,10 +10,9 @@ from viper.lexer import Lexeme
 
 from .ast import nodes as vn
 
-from typing import Any, Callable, Dict, List, NamedTuple, Optional
+from typing import Any, Callable, List, NamedTuple, Optional
 
 
-RuleDict = Dict[str, Language]
 ParamFunc = Callable[[SPPF], Any]
 PartTuple = NamedTuple('PartTuple', [('lang', Language), ('name', Optional[str])])
 
@@ -22,12 +21,13 @@ class LinguifierError(ViperError):
     pass
 
 
-def linguify_grammar_file(filename: str) -> RuleDict:
+def linguify_grammar_file(filename: str, cache_size: Optional[int] = None) -> RuleDict:
     parsed_rules = parse_grammar_file(filename)
-    rule_dict = {}
+    rule_dict = RuleDict(cache_size)
     for rule, production_list in parsed_rules.items():
         lang = linguify_rule(production_list, rule_dict)
         rule_dict[rule] = lang
+    rule_dict.compute_first_sets()
     return rule_dict
 
 
@@ -97,27 +97,27 @@ class ASTNodeRedFunc(RedFunc):
                 raise LinguifierError(f"SPPF has too many children:\n{curr}")
             child = curr[0]
             to_add = None
-            if isinstance(child, ParseTreeEmpty):
+            if child.kind == TREE_EMPTY_KIND:
                 return SPPF()
-            elif isinstance(child, ParseTreeEps):
+            elif child.kind == TREE_EPS_KIND:
                 if name is None:
                     curr = SPPF()
                 else:
                     params[name] = None
-            elif isinstance(child, ParseTreeChar):
+            elif child.kind == TREE_CHAR_KIND:
                 if name is not None:
                     to_add = child.token
                 curr = SPPF()
-            elif isinstance(child, ParseTreePair):
+            elif child.kind == TREE_PAIR_KIND:
                 param_sppf = child.left
                 if len(param_sppf) != 1:
                     raise LinguifierError(f"Invalid child SPPF:\n{param_sppf}")
                 if name is not None:
                     # TODO: This should be checked more safely.
                     param_child = param_sppf[0]
-                    if isinstance(param_child, ParseTreeEps):
+                    if param_child.kind == TREE_EPS_KIND:
                         to_add = None
-                    elif isinstance(param_child, ParseTreeChar):
+                    elif param_child.kind == TREE_CHAR_KIND:
                         to_add = param_child.token
                     else:
                         raise LinguifierError(f"Invalid child SPPF child:\n{param_child}")
@@ -137,7 +137,7 @@ def make_ast_red(lang: Language, name: str, parameters: List[Optional[str]]) ->
 
 
 def make_rule_literal(rule_name: str, rule_dict: RuleDict) -> RuleLiteral:
-    return RuleLiteral(rule_name, rule_dict)
+    return rule_literal(rule_name, rule_dict)
 
 
 def linguify_production_part(part: ProductionPart, rule_dict: RuleDict) -> PartTuple: